@@ -1,6 +1,10 @@
 import configparser
+import glob
 import logging
-from typing import Optional, Dict, Union
+import os
+import select
+import threading
+from typing import Callable, Optional, Dict, Tuple, Union
 from time import monotonic
 from PIL import Image, ImageDraw, ImageFont
 import asyncio
@@ -19,9 +23,19 @@ try:
 except ImportError:
     pass
 
+try:
+    import spidev
+
+except ImportError:
+    spidev = None
+
 LOG = logging.getLogger("loadmanager")
 TIMER_TYPES = ["consume", "inject"]
 LOAD_PIN = 24
+SYSFS_GPIO = "/sys/class/gpio"
+# Labels of the gpiochip of the SoC (Pi 1-3, Pi 4 and Pi 5).
+SOC_GPIOCHIP_LABELS = ("pinctrl-bcm2835", "pinctrl-bcm2711", "pinctrl-rp1")
+MIN_CYCLE_WAIT = 0.1  # Seconds
 
 
 class DummyLoad():
@@ -43,6 +57,142 @@ class DummyLoad():
         return self._status
 
 
+def _sysfs_gpio_number(pin: int) -> int:
+    """
+    Return the sysfs number of a GPIO pin (BCM numbering).
+    This is the pin plus the base of the gpiochip of the SoC, which is not 0 on
+    recent kernels (ex. 512 on a 6.6 kernel).
+    Raise an OSError if the gpiochip is not found.
+    """
+    for chip_path in glob.glob(os.path.join(SYSFS_GPIO, "gpiochip*")):
+        with open(os.path.join(chip_path, "label")) as fh:
+            label = fh.read().strip()
+
+        if label in SOC_GPIOCHIP_LABELS:
+            with open(os.path.join(chip_path, "base")) as fh:
+                return int(fh.read()) + pin
+
+    raise OSError(f"No gpiochip found in {SYSFS_GPIO} for GPIO{pin}.")
+
+
+def _export_pin(pin: int) -> str:
+    """
+    Export the pin in sysfs (if not done yet) and return the path of the pin.
+    """
+    gpio_number = _sysfs_gpio_number(pin)
+    pin_path = os.path.join(SYSFS_GPIO, f"gpio{gpio_number}")
+    if not os.path.exists(pin_path):
+        with open(os.path.join(SYSFS_GPIO, "export"), "w") as fh:
+            fh.write(str(gpio_number))
+
+    return pin_path
+
+
+class SysfsOutput():
+    """
+    GPIO output pin driven directly through sysfs.
+    The value file is kept open, so switching or reading the pin is a single
+    seek + read/write instead of a roundtrip through gpiozero.
+    """
+    def __init__(self, pin: int, initial_value: bool = False) -> None:
+        self.pin = pin
+        pin_path = _export_pin(pin)
+
+        with open(os.path.join(pin_path, "direction"), "w") as fh:
+            fh.write("high" if initial_value else "low")
+
+        self._value_fd = open(os.path.join(pin_path, "value"), "r+b", buffering=0)
+
+    def on(self):
+        self._value_fd.seek(0)
+        self._value_fd.write(b"1")
+
+    def off(self):
+        self._value_fd.seek(0)
+        self._value_fd.write(b"0")
+
+    @property
+    def value(self):
+        self._value_fd.seek(0)
+        return self._value_fd.read(1)[0] - 48
+
+    def close(self):
+        self._value_fd.close()
+
+
+class SysfsButton():
+    """
+    Active low (pulled up) GPIO input pin, read through sysfs.
+    The pin generates an interrupt on both edges, the Buttons class waits for
+    these interrupts and calls handle_event.
+    Sysfs can not set the pull-up, configure it in /boot/config.txt
+    (ex. gpio=17,27=ip,pu).
+    """
+    def __init__(self, pin: int, bounce_time: float = 0) -> None:
+        self.pin = pin
+        self.bounce_time = bounce_time
+        self.when_pressed: Optional[Callable] = None
+        self.when_released: Optional[Callable] = None
+        self._last_event_time = 0.0
+        pin_path = _export_pin(pin)
+
+        with open(os.path.join(pin_path, "direction"), "w") as fh:
+            fh.write("in")
+
+        with open(os.path.join(pin_path, "edge"), "w") as fh:
+            fh.write("both")
+
+        self._value_fd = open(os.path.join(pin_path, "value"), "rb", buffering=0)
+        # Reading the value also clears the pending interrupt.
+        self._value = self._read()
+
+    def _read(self) -> int:
+        self._value_fd.seek(0)
+        return self._value_fd.read(1)[0] - 48
+
+    def fileno(self) -> int:
+        return self._value_fd.fileno()
+
+    @property
+    def is_pressed(self) -> bool:
+        return self._value == 0
+
+    def handle_event(self) -> None:
+        """
+        Read the new pin value and call the callback.
+        Events within the bounce time of the previous event only update the value.
+        """
+        value = self._read()
+        if value == self._value:
+            return
+
+        self._value = value
+        now = monotonic()
+        if now - self._last_event_time < self.bounce_time:
+            return
+
+        self._last_event_time = now
+        callback = self.when_pressed if value == 0 else self.when_released
+        if callback:
+            callback()
+
+    def close(self) -> None:
+        self._value_fd.close()
+
+
+def image_to_pages(image: Image.Image) -> bytes:
+    """
+    Convert a mode "1" image to the SSD1306 frame buffer layout.
+    Each byte holds 8 vertical pixels (LSB on top), page after page.
+    Transposing the image makes every row one column of the display, packed as
+    one byte per page, so the pages only have to be picked out of the rows.
+    """
+    width, height = image.size
+    pages = height // 8
+    columns = image.transpose(Image.TRANSPOSE).tobytes("raw", "1;R")
+    return b"".join(columns[page::pages] for page in range(pages))
+
+
 class Load:
     """
     Defines a load.
@@ -58,9 +208,17 @@ class Load:
         address: Optional[str] = None,
     ) -> None:
         if not address:
-            self._load = gpio.DigitalOutputDevice(
-                pin=LOAD_PIN, initial_value=False
-            )  # See pin numbering
+            self._load = None
+            if os.path.isdir(SYSFS_GPIO):
+                try:
+                    self._load = SysfsOutput(pin=LOAD_PIN, initial_value=False)
+                except OSError as e:
+                    LOG.warning("Unable to use GPIO%d through sysfs: %s", LOAD_PIN, e)
+
+            if self._load is None:
+                self._load = gpio.DigitalOutputDevice(
+                    pin=LOAD_PIN, initial_value=False
+                )  # See pin numbering
             self.gpio_pin = LOAD_PIN
         elif address == "dummy":
             self._load = DummyLoad()  # For testing
@@ -75,6 +233,14 @@ class Load:
         self.hold_timer = hold_timer
         self.state_start_time: Optional[float] = None
 
+        # The entry in the shared status object is updated in place by process().
+        self._status_entry = {
+            "state": False,
+            "current_state_time": None,
+            "previous_state_time": None,
+        }
+        Status().loads[self.name] = self._status_entry
+
     @property
     def status(self) -> str:
         """
@@ -96,6 +262,13 @@ class Load:
         self.state_start_time = monotonic()
         self._load.off()
 
+    def close(self) -> None:
+        """
+        Release the GPIO pin.
+        """
+        if self._load is not None and hasattr(self._load, "close"):
+            self._load.close()
+
     @property
     def is_on(self) -> bool:
         """
@@ -118,14 +291,23 @@ class Load:
         """
         return self.max_power
 
+    def _state_time(self, now: float) -> Union[int, None]:
+        """
+        Count how many seconds we are in a stable state at time 'now'.
+        Return None if the state is not defined yet.
+        """
+        if self.state_start_time is None:
+            return None
+
+        return int(now - self.state_start_time)
+
     @property
     def state_time(self) -> Union[int, None]:
         """
         Count how many seconds we are in a stable state (on of off).
-        Return -1 if the state is not defined yet.
+        Return None if the state is not defined yet.
         """
-        if self.state_start_time:
-            return int(monotonic() - self.state_start_time)
+        return self._state_time(monotonic())
 
     def process(self, injected: int, consumed: int) -> bool:
         """
@@ -135,39 +317,45 @@ class Load:
         # Consumed power in Watt at which the load swicthes off.
         switch_off = 100
 
-        previous_state_time = self.state_time
+        # Read the pin and the clock only once, so the log and the status match the decision.
+        is_on = self._load.value == 1
+        previous_state_time = self._state_time(monotonic())
+        current_state_time = previous_state_time
 
         if (
-            self.is_off and
+            not is_on and
             injected >= self.max_power and
-            ((self.state_time is not None and self.state_time > self.hold_timer) or self.state_time is None)
+            (previous_state_time is None or previous_state_time > self.hold_timer)
         ):
             LOG.info(
                 "Switching load %s ON (injected power: %s, previous state time: %s.)",
                 self.name, injected, previous_state_time
             )
             self.on()
+            is_on = True
+            current_state_time = 0
 
         elif (
-            self.is_on and
+            is_on and
             consumed > switch_off and
-            self.state_time > self.hold_timer
+            previous_state_time is not None and
+            previous_state_time > self.hold_timer
         ):
             LOG.info(
                 "Switching load %s OFF (consumed power: %s, previous state time: %s.)",
                 self.name, consumed, previous_state_time
             )
             self.off()
+            is_on = False
+            current_state_time = 0
 
         # Update the shared status object.
-        status = Status()
-        status.loads[self.name] = {
-            "state": self.is_on,
-            "current_state_time": self.state_time,
-            "previous_state_time:": previous_state_time
-        }
+        entry = self._status_entry
+        entry["state"] = is_on
+        entry["current_state_time"] = current_state_time
+        entry["previous_state_time"] = previous_state_time
 
-        return self.is_on
+        return is_on
 
     def __str__(self) -> str:
         return f"<Load {self.name} - is_on: {self.is_on}, state_time: {self.state_time}s, hold_timer: {self.hold_timer}s."
@@ -191,7 +379,10 @@ class LoadManager:
 
         TODO: add support for other loads, that can connect over wifi or bluetooth.
         """
-        if not load_config.getboolean("enabled", False):
+        # Read the section once, instead of going through the SectionProxy for each option.
+        cfg = dict(load_config)
+        enabled = cfg.get("enabled", "false").lower()
+        if not configparser.ConfigParser.BOOLEAN_STATES.get(enabled, False):
             LOG.info("Load %s is not enabled.", format(load_config.name))
             return
 
@@ -199,10 +390,10 @@ class LoadManager:
         self.load_list.append(
             Load(
                 name=load_config.name[5:],
-                address=load_config.get("address", None),
-                max_power=load_config.getint("max_power"),
-                switch_on=load_config.getint("switch_on"),
-                hold_timer=load_config.getint("hold_timer"),
+                address=cfg.get("address"),
+                max_power=int(cfg["max_power"]),
+                switch_on=int(cfg["switch_on"]),
+                hold_timer=int(cfg["hold_timer"]),
             )
         )
 
@@ -212,12 +403,20 @@ class LoadManager:
         Return the status for each load.
         TODO: define an order for switching all the loads
         """
+        # Round, int() would truncate values like 1.001 kW to 1000 W.
+        injected = round(data.get("actual_total_injection", 0) * 1000)
+        consumed = round(data.get("actual_total_consumption", 0) * 1000)
 
         for load in self.load_list:
-            injected = data.get("actual_total_injection", 0) * 1000
-            consumed = data.get("actual_total_consumption", 0) * 1000
             load.process(injected, consumed)
 
+    def close(self) -> None:
+        """
+        Release the GPIO pins of all the loads.
+        """
+        for load in self.load_list:
+            load.close()
+
 
 class Display:
     """
@@ -238,16 +437,26 @@ class Display:
             i2c=_i2c,
             addr=self.display_address,
         )
+        # Reuse the font and the frame buffer for every update.
+        self._font = ImageFont.load_default()
+        self._image = Image.new("1", (self.oled_witdh, self.oled_height))
+        self._draw = ImageDraw.Draw(self._image)
+        self._last_text: Optional[str] = None
 
     def update_display(self, text: str = "") -> None:
         """
         Update the display with the given text.
+        Nothing is sent to the display if the text did not change.
         """
-        image = Image.new("1", (self.oled_witdh, self.oled_height))
-        draw = ImageDraw.Draw(image)
-        draw.multiline_text((2, 2), text, font=ImageFont.load_default(), fill=255)
-        self._display.image(image)
+        if text == self._last_text:
+            return
+
+        self._draw.rectangle((0, 0, self.oled_witdh, self.oled_height), fill=0)
+        self._draw.multiline_text((2, 2), text, font=self._font, fill=255)
+        # Fill the frame buffer directly, display.image() sets the pixels one by one.
+        self._display.buf[:] = image_to_pages(self._image)
         self._display.show()
+        self._last_text = text
 
     def display_on(self) -> None:
         self._display.poweron()
@@ -257,26 +466,64 @@ class Display:
         self._display.poweroff()
         self.display_is_on = False
 
-    async def cycle(
+    def cycle(
         self,
-        wait: int = 1,
+        wait: float = 1,
+        nbr: int = 1,
         charging_current: float = 0,
         charging_power: float = 0,
         generated_current: float = 0,
         generated_power: float = 0,
-    ) -> None:
+    ) -> asyncio.Future:
         """
         Cycle through all values to display, wait x seconds, and run the loop y times.
-        wait: nbr of seconds to wait between each value
+        wait: nbr of seconds to wait between each value (at least MIN_CYCLE_WAIT)
         nbr: how many time to run the loop
         display is turned off at the end of the last cycle
+        Return a future that is done when the last cycle has ended.
+        Only one timer is pending at a time, it re-arms itself for the next value.
+        Must be called from a coroutine. Cancelling the future stops the cycle.
         """
-        text = f"Charging current:\n    {charging_current}A\nGenerated current:\n    {generated_current}A\n"
-        LOG.debug('Displaying facts: %s', text)
+        loop = asyncio.get_running_loop()
+        self._cycle_done = loop.create_future()
+        if nbr <= 0:
+            self._cycle_done.set_result(None)
+            return self._cycle_done
+
+        self._cycle_texts = [
+            f"Charging current:\n    {charging_current}A\nGenerated current:\n    {generated_current}A\n",
+        ]
+        LOG.debug('Displaying facts: %s', self._cycle_texts)
+        self._cycle_idx = 0
+        self._cycle_end = nbr * len(self._cycle_texts)
         self.display_on()
-        self.update_display(text)
-        await asyncio.sleep(wait)
-        self.display_off()
+        self._tick(loop, max(wait, MIN_CYCLE_WAIT), loop.time())
+
+        return self._cycle_done
+
+    def _tick(self, loop: asyncio.AbstractEventLoop, wait: float, deadline: float) -> None:
+        """
+        Show the next value, and schedule the next tick at a fixed deadline,
+        so the time spent updating the display does not add up.
+        """
+        try:
+            if self._cycle_done.done():
+                # The future was cancelled.
+                self.display_off()
+                return
+
+            if self._cycle_idx >= self._cycle_end:
+                self.display_off()
+                self._cycle_done.set_result(None)
+                return
+
+            self.update_display(self._cycle_texts[self._cycle_idx % len(self._cycle_texts)])
+            self._cycle_idx += 1
+            loop.call_at(deadline + wait, self._tick, loop, wait, deadline + wait)
+
+        except Exception as e:
+            if not self._cycle_done.done():
+                self._cycle_done.set_exception(e)
 
 
 class CurrentSensors:
@@ -287,32 +534,97 @@ class CurrentSensors:
     TODO: Add callibration functionality
     """
 
+    # Sample both channels at most once per interval (seconds).
+    sample_interval = 0.1
+    spi_speed = 1000000  # Hz
+
     def __init__(self) -> None:
-        self.current_vvp = gpio.MCP3204(channel=0, max_voltage=2.5)
-        self.current_car = gpio.MCP3204(channel=1, max_voltage=2.5)
+        self._sample: Tuple[float, float] = (0, 0)
+        self._sample_time: Optional[float] = None
+
+        self._spi = None
+        if spidev is not None:
+            # Keep the SPI device open, instead of setting up the bus for each read.
+            try:
+                spi = spidev.SpiDev()
+                spi.open(0, 0)
+                spi.max_speed_hz = self.spi_speed
+                self._spi = spi
+
+            except OSError as e:
+                LOG.warning("Unable to open the SPI device, using gpiozero: %s", e)
+
+        if self._spi is None:
+            self.current_vvp = gpio.MCP3204(channel=0, max_voltage=2.5)
+            self.current_car = gpio.MCP3204(channel=1, max_voltage=2.5)
 
     @staticmethod
     def u_to_i(value):
         """ Convert measured voltage to current. """
         return round((abs(int(value * 100) - 55)) * 0.000707107, 2)
 
-    def vpp_current(self) -> int:
+    def _read_channel(self, channel: int) -> float:
+        """
+        Read a single ended channel of the MCP3204, return a value between 0 and 1.
+        The ADC needs chip select to go high between 2 conversions,
+        so each channel is a separate transfer.
+        """
+        response = self._spi.xfer2([0x06 | (channel >> 2), (channel & 0x03) << 6, 0x00])
+        return (((response[1] & 0x0F) << 8) | response[2]) / 4095
+
+    def sample(self) -> Tuple[float, float]:
+        """
+        Read both sensors, return the vpp current and the load current.
+        """
+        if self._spi is not None:
+            vpp_value = self._read_channel(0)
+            car_value = self._read_channel(1)
+        else:
+            vpp_value = self.current_vvp.value
+            car_value = self.current_car.value
+
+        self._sample = (self.u_to_i(vpp_value), self.u_to_i(car_value))
+        self._sample_time = monotonic()
+        return self._sample
+
+    def _last_sample(self) -> Tuple[float, float]:
+        """
+        Return the last sample, or take a new one if it is too old.
+        """
+        if self._sample_time is None or monotonic() - self._sample_time >= self.sample_interval:
+            return self.sample()
+
+        return self._sample
+
+    def vpp_current(self) -> float:
         """Return current produced by the solar panels (vpp)."""
-        return self.u_to_i(self.current_vvp.value)
+        return self._last_sample()[0]
 
-    def load_current(self) -> int:
+    def load_current(self) -> float:
         """Return the current used by the load."""
-        return self.u_to_i(self.current_car.value)
+        return self._last_sample()[1]
 
 
 class Buttons:
     """
     Implements the buttons Info and Restart.
+    By default the buttons are gpiozero buttons, which enable the internal pull-ups.
+    With use_sysfs, both buttons are read through sysfs, with one thread waiting
+    for an interrupt on either pin. Sysfs can not enable the pull-ups, they have to
+    be configured in /boot/config.txt.
     """
 
     debounce_time = 0.5  # Seconds
 
-    def __init__(self) -> None:
+    def __init__(self, use_sysfs: bool = False) -> None:
+        if use_sysfs and os.path.isdir(SYSFS_GPIO):
+            try:
+                self._init_sysfs()
+                return
+
+            except OSError as e:
+                LOG.warning("Unable to read the buttons through sysfs: %s", e)
+
         # GPIO17
         self.info_button = gpio.Button(
             pin=17, pull_up=True, bounce_time=self.debounce_time
@@ -322,6 +634,35 @@ class Buttons:
             pin=27, pull_up=True, bounce_time=self.debounce_time
         )
 
+    def _init_sysfs(self) -> None:
+        """
+        Set up both buttons through sysfs, and start the thread waiting for the interrupts.
+        """
+        self.info_button = SysfsButton(pin=17, bounce_time=self.debounce_time)
+        self.restart_button = SysfsButton(pin=27, bounce_time=self.debounce_time)
+        self._buttons = {
+            button.fileno(): button for button in (self.info_button, self.restart_button)
+        }
+        self._epoll = select.epoll()
+        for fd in self._buttons:
+            self._epoll.register(fd, select.EPOLLPRI | select.EPOLLERR)
+
+        self._watcher = threading.Thread(
+            target=self._watch, name="buttons", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        """
+        Wait for the buttons to change state.
+        """
+        while True:
+            for fd, _ in self._epoll.poll():
+                try:
+                    self._buttons[fd].handle_event()
+                except Exception:
+                    LOG.exception("Error handling button event!")
+
 
 class StatusLed:
     """
@@ -0,0 +1,70 @@
+"""
+CRC16/ARC (also known as CRC-16/LHA), the CRC used in the telegrams of the digital meter.
+Polynomial 0x8005, reflected (0xA001), initial value 0.
+
+The CRC is table driven: one lookup per byte instead of 8 shifts per byte.
+When numba is installed, the loop is compiled to machine code.
+"""
+from typing import Union
+
+try:
+    import numpy as np
+    from numba import njit
+
+except ImportError:
+    njit = None
+
+POLYNOMIAL = 0xA001
+INITIAL_VALUE = 0x0000
+
+
+def _generate_table() -> tuple:
+    """Calculate the CRC of every possible byte value."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ POLYNOMIAL if crc & 1 else crc >> 1
+        table.append(crc)
+
+    return tuple(table)
+
+
+TABLE = _generate_table()
+
+
+def _crc16_update(crc: int, data: Union[bytes, bytearray, memoryview]) -> int:
+    """
+    Update the CRC value with the data.
+    """
+    table = TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+
+    return crc
+
+
+if njit is not None:
+    _NP_TABLE = np.array(TABLE, dtype=np.uint16)
+
+    @njit(cache=True)
+    def _crc16_update_jit(crc, data, table):
+        for byte in data:
+            crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+        return crc
+
+    def crc16_update(crc: int, data: Union[bytes, bytearray, memoryview]) -> int:
+        """
+        Update the CRC value with the data.
+        """
+        return int(_crc16_update_jit(crc, np.frombuffer(data, dtype=np.uint8), _NP_TABLE))
+
+else:
+    crc16_update = _crc16_update
+
+
+def crc16(data: Union[bytes, bytearray, memoryview]) -> int:
+    """
+    Calculate the CRC of the data.
+    """
+    return crc16_update(INITIAL_VALUE, data)
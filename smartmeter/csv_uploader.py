@@ -1,9 +1,15 @@
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 import argparse
+import fnmatch
 import sys
-import glob
 import os
 import minio
+import urllib3
+from minio.helpers import MIN_PART_SIZE, MAX_PART_SIZE
+
+# Number of files uploaded in parallel, also the size of the connection pool.
+UPLOAD_WORKERS = 8
 
 
 def parse_cli(cli_args: List) -> argparse.Namespace:
@@ -37,23 +43,65 @@ def parse_cli(cli_args: List) -> argparse.Namespace:
     return parser.parse_args(cli_args)
 
 
-def copy_file_to_bucket(
-    file: str, endpoint: str, access_key: str, secret_key: str, bucket_name: str
-) -> None:
-    """Copy the file to the bucket."""
+def list_files(source_dir: str, pattern: str) -> List[str]:
+    """
+    Return the regular files in source_dir matching the pattern.
+    The directory entries are matched on name, without a stat() per file.
+    Like glob, hidden files (ex. the CSV files still being written) are skipped,
+    unless the pattern starts with a dot.
+    """
+    include_hidden = pattern.startswith(".")
+    with os.scandir(source_dir) as entries:
+        return [
+            entry.path
+            for entry in entries
+            if (include_hidden or not entry.name.startswith("."))
+            and fnmatch.fnmatchcase(entry.name, pattern)
+            and entry.is_file(follow_symlinks=False)
+        ]
+
+
+def create_client(endpoint: str, access_key: str, secret_key: str) -> minio.Minio:
+    """
+    Create a Minio client.
+    The client is shared between the upload threads, so the connections
+    in the pool are reused instead of doing a TLS handshake for each file.
+    """
+    http_client = urllib3.PoolManager(
+        maxsize=UPLOAD_WORKERS,
+        num_pools=1,
+        timeout=urllib3.Timeout(connect=300, read=300),
+        retries=urllib3.Retry(3),
+    )
+    return minio.Minio(
+        endpoint, access_key, secret_key, secure=True, http_client=http_client
+    )
+
+
+def copy_file_to_bucket(file: str, mc: minio.Minio, bucket_name: str) -> bool:
+    """
+    Copy the file to the bucket.
+    The local file is only removed when the upload succeeded.
+    Return True if the file was copied.
+    """
     print("Copy file %s" % file)
 
     _, filename = os.path.split(file)
-    mc = minio.Minio(endpoint, access_key, secret_key, secure=True)
 
     try:
-        mc.fput_object(bucket_name, filename, file)
+        # Upload files up to the maximum part size in a single request.
+        size = os.path.getsize(file)
+        part_size = min(max(size, MIN_PART_SIZE), MAX_PART_SIZE)
+        with open(file, "rb") as fh:
+            mc.put_object(bucket_name, filename, fh, size, part_size=part_size)
         print("Copy done.")
         os.unlink(file)
         print("Deleted local file.")
+        return True
 
     except minio.S3Error as err:
         print("Could not copy %s: %s" % (filename, err))
+        return False
 
 
 def main() -> None:
@@ -68,14 +116,17 @@ def main() -> None:
         )
         sys.exit(1)
 
-    files = glob.glob(os.path.join(args.source_dir, args.file_pattern))
+    files = list_files(args.source_dir, args.file_pattern)
+
+    mc = create_client(args.hostname, access_key, secret_key)
 
     print("Start")
-    for file in files:
-        print("Copying file %s" % file)
-        copy_file_to_bucket(file, args.hostname, access_key, secret_key, args.bucket)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        results = list(
+            executor.map(lambda file: copy_file_to_bucket(file, mc, args.bucket), files)
+        )
 
-    print("Done. Copied %s files." % len(files))
+    print("Done. Copied %s files." % sum(results))
     sys.stdout.flush()
 
 
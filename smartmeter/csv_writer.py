@@ -1,16 +1,36 @@
 import csv
+import io
 import os
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 from datetime import datetime
-from time import monotonic, sleep
+from time import monotonic
 from smartmeter.digimeter import FIELDS, convert_timestamp
 import logging
 
 LOG = logging.getLogger("main")
-FIELDNAMES = ["timestamp", "gas_timestamp"] + [
-    f[1] for f in FIELDS if "timestamp" not in f[1]
-]
+VALUE_FIELDNAMES = tuple(f[1] for f in FIELDS if "timestamp" not in f[1])
+FIELDNAMES = ["timestamp", "gas_timestamp"] + list(VALUE_FIELDNAMES)
 WIP_PREFIX = ".wip__"
+FILE_BUFFER_SIZE = 1 << 16
+LINE_TERMINATOR = "\r\n"
+
+
+def format_row(row: tuple) -> bytes:
+    """
+    Format a row as a CSV line.
+    The telegram values are numbers and timestamps, which never need quoting.
+    Rows with a field that does, are formatted by the csv module.
+    """
+    line = ",".join(map(str, row))
+    if line.count(",") != len(row) - 1 or '"' in line or "\r" in line or "\n" in line:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator=LINE_TERMINATOR).writerow(row)
+        return buffer.getvalue().encode()
+
+    return (line + LINE_TERMINATOR).encode()
+
+
+HEADER = format_row(tuple(FIELDNAMES))
 
 
 class CSVWriter:
@@ -33,54 +53,46 @@ class CSVWriter:
         self.write_every: int = write_every
         self.max_lines = max_lines
         self.max_age = max_age
-        self.dictwriter = None
         self.filehandler = None
+        self._filename: Optional[str] = None
         self.create_time = 0
         self.lines_written = 0
         self.batch = []
 
-    def _generate_filename(self) -> str:
+    def _create_file(self) -> Tuple[str, int]:
         """
-        Generate a unique filename.
+        Create a new, uniquely named, file and return its name and file descriptor.
+        When the name is already taken, a counter is added to the name.
         """
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        counter = 0
         while True:
-            filename = os.path.join(
-                self.path,
-                WIP_PREFIX
-                + self.prefix
-                + "_"
-                + datetime.now().strftime("%Y%m%d%H%M%S")
-                + ".csv",
-            )
-            target_filename = os.path.join(
-                self.path, os.path.split(filename)[1][len(WIP_PREFIX):]
-            )
-            if not os.path.exists(target_filename):
-                return filename
-            else:
-                LOG.warning(
-                    "File %s already exists, waiting 1 sec. to generate new name.",
-                    filename,
-                )
-                sleep(1)
+            name = self.prefix + "_" + timestamp + (f"_{counter}" if counter else "") + ".csv"
+            filename = os.path.join(self.path, WIP_PREFIX + name)
+            # The file is renamed to the target when it is closed.
+            existing_filename = os.path.join(self.path, name)
+            if not os.path.exists(existing_filename):
+                try:
+                    return filename, os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                except FileExistsError:
+                    existing_filename = filename
+
+            # Rotating more than once within a second is normal, not worth a warning.
+            LOG.debug("File %s already exists, adding a counter to the name.", existing_filename)
+            counter += 1
 
     def open(self) -> None:
         """
-        Create a DicWriter instance for the file opened, and write the
-        CSV header.
-        WARNING: If you rotate files within the second, the creation of the
-        new file will be postponed with one second.
+        Open a new CSV file, and write the CSV header.
+        If you rotate files within the second, a counter is added to the filename.
         """
         if self.filehandler and not self.filehandler.closed:
             return
 
-        filename = self._generate_filename()
-        LOG.debug("Creating CSV file %s", format(filename))
-        self.filehandler = open(filename, "w")
-        self.dictwriter = csv.DictWriter(
-            self.filehandler, fieldnames=FIELDNAMES, quoting=csv.QUOTE_MINIMAL
-        )
-        self.dictwriter.writeheader()
+        self._filename, fd = self._create_file()
+        LOG.debug("Creating CSV file %s", self._filename)
+        self.filehandler = open(fd, "wb", buffering=FILE_BUFFER_SIZE)
+        self.filehandler.write(HEADER)
         self.lines_written = 0
         self.create_time = monotonic()
 
@@ -88,28 +100,27 @@ class CSVWriter:
         """
         Close the CSV file.
         """
-        if self.filehandler.closed:
-            return
-
-        # Write the remainder of the rows.
-        if flush is True and len(self.batch) > 0:
+        # Write the remainder of the rows. When max_lines is reached the file is
+        # rotated, so the remainder can take more than one file.
+        while flush is True and len(self.batch) > 0:
             LOG.debug("Writing the remainder (%s lines) to the file.", len(self.batch))
             self.write(flush=True)
 
+        if self.filehandler is None or self.filehandler.closed:
+            return
+
         filename = self.filename
-        LOG.debug("Closing file {}.".format(self.filename))
+        LOG.debug("Closing file %s.", filename)
         self.filehandler.close()
         # If no rows have been written to the file, we can remove it.
         if self.lines_written == 0:
-            LOG.debug(
-                "Removing file {} since no rows were written to it.".format(filename)
-            )
+            LOG.debug("Removing file %s since no rows were written to it.", filename)
             os.unlink(filename)
         else:
             new_filename = os.path.join(
                 self.path, os.path.split(filename)[1][len(WIP_PREFIX):]
             )
-            LOG.debug("Renaming file to {}.".format(new_filename))
+            LOG.debug("Renaming file to %s.", new_filename)
             os.rename(filename, new_filename)
 
     @property
@@ -117,7 +128,7 @@ class CSVWriter:
         """
         Returns the filename or None.
         """
-        return self.filehandler.name or None
+        return self._filename
 
     def write(self, telegram: Optional[dict] = None, flush: bool = False) -> None:
         """
@@ -125,30 +136,36 @@ class CSVWriter:
         TODO: Handle disk full/permission denied.
         """
         if telegram:
-            # Remove the local timestamp field, as it is not used in the CSV files.
-            del telegram["local_timestamp"]
-            telegram["timestamp"] = convert_timestamp(
-                telegram["timestamp"], format="iso8601"
-            )
-            telegram["gas_timestamp"] = convert_timestamp(
-                telegram["gas_timestamp"], format="iso8601"
+            # The row is ordered like FIELDNAMES, the local timestamp is not used in the CSV files.
+            # The telegram itself is left untouched, it is shared with the other consumers.
+            self.batch.append(
+                (
+                    convert_timestamp(telegram["timestamp"], format="iso8601"),
+                    convert_timestamp(telegram["gas_timestamp"], format="iso8601"),
+                )
+                + tuple(telegram.get(key, "") for key in VALUE_FIELDNAMES)
             )
 
-            self.batch.append(telegram)
-
         if len(self.batch) < self.write_every and flush is False:
             return
 
         self.open()
-        while self.batch:
-            self.dictwriter.writerow(self.batch.pop())
-            self.lines_written += 1
-
-            if (
-                self.max_age + self.create_time <= monotonic()
-                or self.lines_written == self.max_lines
-            ):
-                LOG.debug("%s Lines written to CSV file.", self.lines_written)
-                self.close()
-                break
+        # Write the rows in the order they were received, up to max_lines.
+        # The rows that do not fit stay in the batch for the next file.
+        if self.max_lines is None:
+            rows, self.batch = self.batch, []
+        else:
+            room = self.max_lines - self.lines_written
+            rows, self.batch = self.batch[:room], self.batch[room:]
+
+        self.filehandler.writelines(map(format_row, rows))
+        self.lines_written += len(rows)
+
+        if (
+            self.max_lines is not None and self.lines_written >= self.max_lines
+        ) or (
+            self.max_age is not None and self.max_age + self.create_time <= monotonic()
+        ):
+            LOG.debug("%s Lines written to CSV file.", self.lines_written)
+            self.close()
 
@@ -1,55 +1,75 @@
-from crccheck.crc import Crc16Lha
 import serial
+import mmap
 import re
 from typing import Optional
+from functools import lru_cache
 from serial.serialutil import SerialException
 from queue import Queue
 from datetime import datetime
 from time import sleep
 import time
 from smartmeter.utils import autoformat
-from dateutil import parser as dateutil_parser
+from smartmeter.crc16 import crc16
 import logging
 
 LOG = logging.getLogger("digimeter")
 
 
-START_OF_TELEGRAM = re.compile(r"^\/FLU\d{1}\\")
-END_OF_TELEGRAM = re.compile(r"^![A-Z0-9]{4}")
+START_OF_TELEGRAM = re.compile(rb"^/FLU\d\\")
+END_OF_TELEGRAM = re.compile(rb"^![A-Z0-9]{4}")
+CRC_TAIL_SIZE = 6  # The CRC in hex, followed by CRLF.
+MAX_TELEGRAM_SIZE = 4096
+TELEGRAM = re.compile(rb"^/FLU\d\\.*?^![A-Z0-9]{4}\r?\n?", re.DOTALL | re.MULTILINE)
 FIELDS = [
-    # (Field name, dictionary key, start position, end position)
-    ("0-0:1.0.0", "timestamp", 10, 23),
-    ("1-0:1.8.1", "total_consumption_day", 10, 20),
-    ("1-0:1.8.2", "total_consumption_night", 10, 20),
-    ("1-0:2.8.1", "total_injection_day", 10, 20),
-    ("1-0:2.8.2", "total_injection_night", 10, 20),
-    ("0-0:96.14.0", "actual_tariff", 12, 16),
-    ("1-0:1.7.0", "actual_total_consumption", 10, 16),
-    ("1-0:2.7.0", "actual_total_injection", 10, 16),
-    ("1-0:21.7.0", "actual_l1_consumption", 11, 17),
-    ("1-0:41.7.0", "actual_l2_consumption", 11, 17),
-    ("1-0:61.7.0", "actual_l3_consumption", 11, 17),
-    ("1-0:22.7.0", "actual_l1_injection", 11, 17),
-    ("1-0:42.7.0", "actual_l2_injection", 11, 17),
-    ("1-0:62.7.0", "actual_l3_injection", 11, 17),
-    ("1-0:32.7.0", "l1_voltage", 11, 16),
-    ("1-0:52.7.0", "l2_voltage", 11, 16),
-    ("1-0:72.7.0", "l3_voltage", 11, 16),
-    ("1-0:31.7.0", "l1_current", 11, 17),
-    ("1-0:51.7.0", "l2_current", 11, 17),
-    ("1-0:71.7.0", "l3_current", 11, 17),
-    ("0-1:24.2.3", "total_gas_consumption", 26, 35),
-    ("0-1:24.2.3", "gas_timestamp", 11, 24),
+    # (Field name, dictionary key, start position, end position, type)
+    ("0-0:1.0.0", "timestamp", 10, 23, str),
+    ("1-0:1.8.1", "total_consumption_day", 10, 20, float),
+    ("1-0:1.8.2", "total_consumption_night", 10, 20, float),
+    ("1-0:2.8.1", "total_injection_day", 10, 20, float),
+    ("1-0:2.8.2", "total_injection_night", 10, 20, float),
+    ("0-0:96.14.0", "actual_tariff", 12, 16, int),
+    ("1-0:1.7.0", "actual_total_consumption", 10, 16, float),
+    ("1-0:2.7.0", "actual_total_injection", 10, 16, float),
+    ("1-0:21.7.0", "actual_l1_consumption", 11, 17, float),
+    ("1-0:41.7.0", "actual_l2_consumption", 11, 17, float),
+    ("1-0:61.7.0", "actual_l3_consumption", 11, 17, float),
+    ("1-0:22.7.0", "actual_l1_injection", 11, 17, float),
+    ("1-0:42.7.0", "actual_l2_injection", 11, 17, float),
+    ("1-0:62.7.0", "actual_l3_injection", 11, 17, float),
+    ("1-0:32.7.0", "l1_voltage", 11, 16, float),
+    ("1-0:52.7.0", "l2_voltage", 11, 16, float),
+    ("1-0:72.7.0", "l3_voltage", 11, 16, float),
+    ("1-0:31.7.0", "l1_current", 11, 17, float),
+    ("1-0:51.7.0", "l2_current", 11, 17, float),
+    ("1-0:71.7.0", "l3_current", 11, 17, float),
+    ("0-1:24.2.3", "total_gas_consumption", 26, 35, float),
+    ("0-1:24.2.3", "gas_timestamp", 11, 24, str),
 ]
 
 
+def _fields_by_code() -> dict:
+    """
+    Group the fields by their OBIS code, to find the fields of a line with one lookup.
+    Fields sharing the same code (the gas line) end up in the same entry.
+    """
+    fields_by_code = {}
+    for code, key, start, end, convert in FIELDS:
+        fields_by_code[code] = fields_by_code.get(code, ()) + ((key, start, end, convert),)
+
+    return fields_by_code
+
+
+FIELDS_BY_CODE = _fields_by_code()
+
+
 def calculate_timestamp_drift(ts_type: str, iso_8601_timestamp: str) -> int:
     """
     Calculates the drift between the system time and the telegram timestamp.
     Log a warning message when the drift is more than one minute. (Disabled)
     """
     local_timestamp = datetime.now().astimezone()
-    telegram_timestamp = dateutil_parser.parse(iso_8601_timestamp)
+    # The timestamp is always formatted by convert_timestamp, no need for a generic parser.
+    telegram_timestamp = datetime.fromisoformat(iso_8601_timestamp)
     delta_seconds = int((local_timestamp - telegram_timestamp).total_seconds())
     # delta_human_readable = "{:0>8}".format(str(timedelta(seconds=delta_seconds)))
     #
@@ -63,12 +83,14 @@ def calculate_timestamp_drift(ts_type: str, iso_8601_timestamp: str) -> int:
     return delta_seconds
 
 
+@lru_cache(maxsize=8)
 def convert_timestamp(timestamp: str, format: Optional[str] = None) -> str:
     """
     Convert a timestamp in the for of '211024195235S' in iso8601 format or
     CET/CEST format
     YYMMDDHHMMSS[WS]
     Last letter can be a S (summer) or a W (winter).
+    The same timestamp is converted several times per telegram, so the last results are cached.
 
     format: None | iso8601
     """
@@ -103,51 +125,100 @@ def parse(raw_msg):
 
     msg = {"local_timestamp": datetime.now().isoformat()}
 
-    for line in raw_msg.strip().splitlines():
-        for code, key, start, end in FIELDS:
-            if line.startswith(code):
-                msg[key] = autoformat(line[start:end])
+    for line in raw_msg.splitlines():
+        # The OBIS code is everything in front of the first '('.
+        fields = FIELDS_BY_CODE.get(line[: line.find("(")])
+        if fields:
+            for key, start, end, convert in fields:
+                # Every field has a fixed type, no need to guess it from the value.
+                try:
+                    msg[key] = convert(line[start:end])
+                except ValueError:
+                    msg[key] = autoformat(line[start:end])
 
     return msg
 
 
+def check_crc(calculated_crc: int, raw_crc: bytes) -> bool:
+    """
+    Compare the calculated CRC with the CRC provided at the end of the telegram.
+    raw_crc is the part after the '!', the CRC in hex.
+    Return True if they match.
+    """
+    try:
+        provided_crc = int(raw_crc[:4], 16)
+
+    except ValueError:
+        LOG.warning("Unable to calculate CRC! Provided value: %s.", raw_crc)
+        return False
+
+    crc_match = calculated_crc == provided_crc
+    if crc_match:
+        LOG.debug("Telegram has a valid CRC.")
+    else:
+        LOG.warning(
+            "Telegram has an invalid CRC! Provided: %04X - Calculated: %04X.",
+            provided_crc,
+            calculated_crc,
+        )
+
+    return crc_match
+
+
 def check_msg(raw_msg: bytearray) -> bool:
     """
     Check if the message is valid.
     The provided CRC should be the same as the calculated one.
     Return True
     """
-    provided_crc: str = ""
-    calculated_crc: str = ""
-
     # Find the end of message character '!'
     LOG.debug("Checking message CRC. Message length is %d.", len(raw_msg))
     pos = raw_msg.find(b"!")
-    data = raw_msg[: pos + 1]
 
     try:
-        provided_crc = hex(int(raw_msg[pos + 1 :].strip(), 16))  # noqa: E203
-        calculated_crc = hex(Crc16Lha.calc(data))
-
-    except ValueError:
-        LOG.warning("Unable to calculate CRC! Provided value: %s.", provided_crc)
-        return False
+        # Use a memoryview to calculate the CRC without copying the message.
+        calculated_crc = crc16(memoryview(raw_msg)[: pos + 1])
 
     except Exception:
         LOG.exception("Unexpected error in CRC calculation!")
         return False
 
-    crc_match = calculated_crc == provided_crc
-    if crc_match:
-        LOG.debug("Telegram has a valid CRC.")
-    else:
-        LOG.warning(
-            "Telegram has an invalid CRC! Provided: %s - Calculated: %s.",
-            provided_crc,
-            calculated_crc,
+    return check_crc(calculated_crc, raw_msg[pos + 1 :])  # noqa: E203
+
+
+def process_telegram(msg_q: Queue, telegram: bytes, crc_tail: bytes) -> bool:
+    """
+    Check the CRC of a telegram read from the serial port, parse it and add it to the queue.
+    telegram is the data up to and including the '!', crc_tail is what follows.
+    Return False if the data does not contain the start of a telegram.
+    """
+    # The first read may start in the middle of a telegram.
+    start = telegram.rfind(b"/FLU")
+    if start == -1 or not START_OF_TELEGRAM.match(telegram[start : start + 6]):  # noqa: E203
+        LOG.warning("Incomplete telegram received, skipping it.")
+        return False
+
+    telegram = telegram[start:]
+    # Only build and decode the telegram for the log when it is logged.
+    if LOG.isEnabledFor(logging.DEBUG):
+        LOG.debug(
+            "Recorded a new telegram: %s",
+            (telegram + crc_tail).decode("ascii", errors="replace"),
         )
 
-    return crc_match
+    # The CRC includes the '!', what follows is the provided CRC.
+    if check_crc(crc16(telegram), crc_tail):
+        # If the CRC is correct, add it to the queue.
+        # A telegram with a valid CRC is plain ASCII, decode it only once.
+        queue_data = parse(telegram.decode("ascii"))
+        calculate_timestamp_drift(
+            "Electricity",
+            convert_timestamp(queue_data.get("timestamp"), format="iso8601"),
+        )
+        LOG.debug("Adding parsed data to the queue.")
+        msg_q.put(queue_data)
+
+    return True
 
 
 def read_serial(
@@ -166,9 +237,11 @@ def read_serial(
     """
     global log
     telegram_count: int = 0
-    line: bytes
-    start_of_telegram_detected: bool = False
-    telegram: bytearray = bytearray()
+    telegram_pointer: int = 0
+    buffer: bytearray = bytearray()  # Data read from the serial port, not processed yet.
+    telegram: bytes
+    crc_tail: bytes
+    end: int
 
     LOG.debug(
         "Open serial port '%s' with settings '%d,%d,%s,%d'.",
@@ -183,50 +256,49 @@ def read_serial(
         port, baudrate, bytesize, parity, stopbits, timeout=5
     ) as serial_port:
         LOG.debug("Reading from serial port '%s'.", port)
+        next_report = time.monotonic() + 60.0
         while True:
             try:
-                # Read data from port
-                line = serial_port.readline()
-
-                if START_OF_TELEGRAM.search(line.decode("ascii")):  # Start of message
-                    LOG.debug("Start of message deteced.")
-                    telegram = bytearray()
-                    start_of_telegram_detected = True
-
-                if start_of_telegram_detected:
-                    telegram += line
-
-                if END_OF_TELEGRAM.search(line.decode("ascii")):  # End of message
-                    LOG.debug("End of message deteced.")
-                    telegram_count += 1
-                    start_of_telegram_detected = False
-                    LOG.debug("Recorded a new telegram: %s", telegram.decode("ascii"))
-
-                    if check_msg(telegram):
-                        # If the CRC is correct, add it to the queue.
-                        queue_data = parse(telegram.decode())
-                        calculate_timestamp_drift(
-                            "Electricity",
-                            convert_timestamp(
-                                queue_data.get("timestamp"), format="iso8601"
-                            ),
-                        )
-                        LOG.debug("Adding parsed data to the queue.")
-                        msg_q.put(queue_data)
+                # Read everything that is waiting at once, readline and read_until
+                # read the serial port one byte per call.
+                buffer += serial_port.read(serial_port.in_waiting or 1)
+
+                # Process the complete telegrams in the buffer: the data up to and
+                # including the '!', followed by the CRC and the line ending.
+                end = buffer.find(b"!")
+                while end != -1 and len(buffer) >= end + 1 + CRC_TAIL_SIZE:
+                    telegram = bytes(buffer[: end + 1])
+                    crc_tail = bytes(buffer[end + 1 : end + 1 + CRC_TAIL_SIZE])  # noqa: E203
+                    # Remove the telegram before processing it, so an error does not
+                    # leave it in the buffer. Deleting from the front of a bytearray
+                    # keeps its allocated memory for the next reads.
+                    del buffer[: end + 1 + CRC_TAIL_SIZE]
+                    end = buffer.find(b"!")
+                    if process_telegram(msg_q, telegram, crc_tail):
+                        telegram_count += 1
+
+                if end == -1 and len(buffer) > MAX_TELEGRAM_SIZE:
+                    LOG.warning("No end of telegram found, discarding %d bytes.", len(buffer))
+                    buffer.clear()
 
             except SerialException:
                 LOG.error("Error while reading serial port!")
-                start_of_telegram_detected = False
-
-            except UnicodeDecodeError as e:
-                LOG.error("Could not decode line received from the serial port: %s", e)
-                start_of_telegram_detected = False
 
             except Exception:
                 LOG.exception("Uncaught exception while reading from the serial port!")
                 pass
 
-            if _quit_after and _quit_after == telegram_count:
+            # Report the number of telegrams received once per minute.
+            now = time.monotonic()
+            if now >= next_report:
+                LOG.info(
+                    "Received %d telegrams in the last minute.",
+                    telegram_count - telegram_pointer,
+                )
+                telegram_pointer = telegram_count
+                next_report = now + 60.0
+
+            if _quit_after and _quit_after <= telegram_count:
                 break
 
 
@@ -242,23 +314,17 @@ def fake_serial(
     If run_forever is True, restart when EOF is reached.
     """
     LOG.debug("Faking serial reader...")
-    telegram = ""
     forever = True
     while forever:
         forever = forever & run_forever
 
-        with open(filename) as fh:
-            for line in fh.readlines():
-                if START_OF_TELEGRAM.search(line):
-                    telegram = line
-                else:
-                    telegram += line
-
-                if END_OF_TELEGRAM.search(line):
-                    LOG.debug("Creating mocked telegram.")
-                    queue_data = parse(telegram)
-                    msg_q.put_nowait(queue_data)
-                    if wait is True:
-                        sleep(1)
+        # Find the telegrams in the mapped file, instead of reading it line by line.
+        with open(filename, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for telegram in TELEGRAM.finditer(mm):
+                LOG.debug("Creating mocked telegram.")
+                queue_data = parse(telegram.group().decode())
+                msg_q.put_nowait(queue_data)
+                if wait is True:
+                    sleep(1)
 
     return
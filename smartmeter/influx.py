@@ -1,11 +1,73 @@
 from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
-from typing import Dict, List
-from smartmeter.digimeter import convert_timestamp
+from influxdb_client import WritePrecision
+from typing import Any, Dict, Optional
+from smartmeter.digimeter import FIELDS, convert_timestamp
+from datetime import datetime
+from functools import lru_cache
 from time import monotonic
 import logging
 
 LOG = logging.getLogger("main")
 
+# Line protocol format of a field, per field type.
+# Integers get the 'i' suffix, to keep the same field types as before.
+FIELD_FORMATS = {float: b"%r", int: b"%di"}
+
+
+def _lineproto_fields(gas: bool) -> tuple:
+    """
+    Return (key, type, format) of the electricity or gas fields.
+    The format is the complete field, ex. b"l1_voltage=%r".
+    """
+    return tuple(
+        (key, field_type, key.encode("ascii") + b"=" + FIELD_FORMATS[field_type])
+        for (_, key, _, _, field_type) in FIELDS
+        if "timestamp" not in key and ("gas" in key) is gas
+    )
+
+
+E_FIELDS = _lineproto_fields(gas=False)
+G_FIELDS = _lineproto_fields(gas=True)
+
+
+def lineproto_value(value: Any) -> bytes:
+    """
+    Format a field value for the line protocol.
+    Used for values that do not have the type of their field.
+    """
+    if isinstance(value, bool):
+        return b"true" if value else b"false"
+    if isinstance(value, int):
+        return b"%di" % value
+    if isinstance(value, float):
+        return repr(value).encode("ascii")
+
+    return b'"' + str(value).replace("\\", "\\\\").replace('"', '\\"').encode() + b'"'
+
+
+@lru_cache(maxsize=8)
+def epoch(timestamp: str) -> int:
+    """
+    Convert a timestamp from the meter in the number of seconds since the epoch.
+    The gas timestamp only changes every few minutes, so the last results are cached.
+    """
+    iso_8601_timestamp = convert_timestamp(timestamp, format="iso8601")
+    return int(datetime.fromisoformat(iso_8601_timestamp).timestamp())
+
+
+def lineproto_fields(data: Dict, fields: tuple) -> bytes:
+    """
+    Format the fields found in data as line protocol, separated by a comma.
+    Values of the expected type are formatted with the precomputed format.
+    """
+    return b",".join(
+        field_format % data[key]
+        if type(data[key]) is field_type
+        else key.encode("ascii") + b"=" + lineproto_value(data[key])
+        for (key, field_type, field_format) in fields
+        if key in data
+    )
+
 
 class DbInflux:
     """
@@ -36,74 +98,72 @@ class DbInflux:
         self.batch = []
         self.upload_interval = upload_interval
         self.last_upload_time: int = 0
+        # The client is created on the first upload, and reused for the next ones.
+        self._client: Optional[InfluxDBClientAsync] = None
+        self._write_api = None
 
     async def write(self, data: Dict) -> None:
         """
         Write a telegram to an influx bucket.
         """
-        if (
-            monotonic() - self.last_upload_time < self.upload_interval
-            or len(self.batch) == 0
-        ):
-            self.batch.append(self.craft_json(data))
+        self.batch.append(self.craft_lineproto(data))
+        if monotonic() - self.last_upload_time < self.upload_interval:
             LOG.debug(
                 "Adding datapoints to batch (contains %d datapoints).", len(self.batch)
             )
             return
 
         LOG.info("Writing %d datapoint(s) to InfluxDB at %s", len(self.batch), self.url)
-        async with InfluxDBClientAsync(
-            url=self.url,
-            token=self.token,
+        if self._client is None:
+            self._client = InfluxDBClientAsync(
+                url=self.url,
+                token=self.token,
+                org=self.org,
+                timeout=self.timeout,
+                verify_ssl=self.verify_ssl,
+                ssl_ca_cert=self.ssl_ca_cert,
+            )
+            self._write_api = self._client.write_api()
+
+        await self._write_api.write(
+            bucket=self.bucket,
+            record=self.batch,
             org=self.org,
-            timeout=self.timeout,
-            verify_ssl=self.verify_ssl,
-            ssl_ca_cert=self.ssl_ca_cert,
-        ) as db:
-            write_api = db.write_api()
-            await write_api.write(bucket=self.bucket, record=self.batch, org=self.org)
-            self.batch = []
-            self.last_upload_time = monotonic()
-
-    def craft_json(self, data: Dict) -> List[Dict]:
+            write_precision=WritePrecision.S,
+        )
+        self.batch.clear()
+        self.last_upload_time = monotonic()
+
+    async def close(self) -> None:
         """
-        Prepare the data to be written to InfluxDB.
+        Close the connection to InfluxDB.
         """
-        LOG.debug("Crafting Influx datapoints.")
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            self._write_api = None
+
+    def craft_lineproto(self, data: Dict) -> bytes:
+        """
+        Prepare the data to be written to InfluxDB, directly in line protocol.
+        A measurement without fields is left out, InfluxDB rejects the whole batch
+        if one line has no fields.
+        """
+        LOG.debug("Crafting Influx line protocol.")
+        ts = b" %d" % epoch(data.get("timestamp", ""))
+        lines = []
 
         # Electricity data.
-        e_data = {
-            "measurement": "electricity",
-            "tags": {},
-            "time": convert_timestamp(data.get("timestamp", ""), format="iso8601"),
-            "fields": {
-                key: value
-                for (key, value) in data.items()
-                if ("timestamp" not in key and "gas" not in key)
-            },
-        }
-        LOG.debug("Electricity data point: %s", e_data)
-
-        # Gas data.
-        g_data = {
-            "measurement": "gas",
-            "tags": {},
-            "time": convert_timestamp(data.get("gas_timestamp", ""), format="iso8601"),
-            "fields": {
-                key: value
-                for (key, value) in data.items()
-                if ("timestamp" not in key and "gas" in key)
-            },
-        }
-        LOG.debug("Gas data point: %s", g_data)
+        fields = lineproto_fields(data, E_FIELDS)
+        if fields:
+            lines.append(b"electricity " + fields + ts)
+
+        # Gas data, with the timestamp of the gas meter.
+        fields = lineproto_fields(data, G_FIELDS)
+        if fields:
+            lines.append(b"gas " + fields + b" %d" % epoch(data.get("gas_timestamp", "")))
 
         # Load data.
-        l_data = {
-            "measurement": "load",
-            "tags": {},
-            "time": convert_timestamp(data.get("timestamp", ""), format="is8601"),
-            "fields": {"load_on": data.get("load_status", 0)},
-        }
-        LOG.debug("Load data point: %s", l_data)
-
-        return [e_data, g_data, l_data]
+        lines.append(b"load load_on=" + lineproto_value(data.get("load_status", 0)) + ts)
+
+        return b"\n".join(lines)
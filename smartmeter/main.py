@@ -2,7 +2,14 @@ import asyncio
 import sys
 import os
 import logging
-from smartmeter.utils import parse_cli, load_config, init_logging, update_log_config
+import threading
+from smartmeter.utils import (
+    parse_cli,
+    load_config,
+    init_logging,
+    shutdown_logging,
+    update_log_config,
+)
 import multiprocessing as mp
 import configparser
 from typing import Optional
@@ -42,53 +49,60 @@ def start_serial_reader(
     log = init_logging(
         filename="digimeter.log",
         logpath=new_log_config.get("logpath"),
-        log_to_stdout=new_log_config.getboolean("log_to_stdout"),
-        keep=new_log_config.getint("keep"),
+        log_to_stdout=configparser.ConfigParser.BOOLEAN_STATES[
+            new_log_config.get("log_to_stdout", "no").lower()
+        ],
+        keep=int(new_log_config.get("keep")),
         size=new_log_config.get("size"),
         loglevel=new_log_config.get("loglevel"),
         name="digimeter",
     )
     log.info("--- Start ---")
-    read_serial(
-        msg_q=msg_q,
-        port=cfg.get("port"),
-        baudrate=cfg.getint("baudrate"),
-        bytesize=cfg.getint("bytesize"),
-        parity=cfg.get("parity"),
-        stopbits=cfg.getint("stopbits"),
-    )
+    try:
+        read_serial(
+            msg_q=msg_q,
+            port=cfg.get("port"),
+            baudrate=cfg.getint("baudrate"),
+            bytesize=cfg.getint("bytesize"),
+            parity=cfg.get("parity"),
+            stopbits=cfg.getint("stopbits"),
+        )
+    finally:
+        # This process exits without running the atexit hooks.
+        shutdown_logging(log)
 
 
-async def display() -> None:
+async def display(sysfs_buttons: bool = False) -> None:
     """
     Display data when the info button is pressed,
     """
     disp = Display()
-    bttns = Buttons()
-    activated = False
+    bttns = Buttons(use_sysfs=sysfs_buttons)
     data = Status()
+    loop = asyncio.get_running_loop()
+    pressed = asyncio.Event()
+
+    # The button callbacks run in the thread of the buttons, not in the event loop.
+    bttns.info_button.when_pressed = lambda: loop.call_soon_threadsafe(pressed.set)
 
     while True:
+        await pressed.wait()
         try:
-            if bttns.info_button.is_pressed and not activated:
-                activated = True
-                LOG.debug("Info button is pressed.")
-                try:
-                    await disp.cycle(
-                        wait=3,
-                        charging_current=data.sensors["current_car"],
-                        generated_current=data.sensors["current_vvp"],
-                    )
-                except KeyError:
-                    asyncio.sleep(1)
-
-                activated = False
+            LOG.debug("Info button is pressed.")
+            await disp.cycle(
+                wait=3,
+                charging_current=data.sensors["current_car"],
+                generated_current=data.sensors["current_vvp"],
+            )
+
+        except KeyError:
+            await asyncio.sleep(1)
 
         except Exception:
             LOG.exception("Uncaught exception in display co routine!")
-            activated = False
 
-        await asyncio.sleep(0.1)
+        # Ignore the button while the values are displayed.
+        pressed.clear()
 
 
 async def status_led() -> None:
@@ -101,10 +115,11 @@ async def status_led() -> None:
 
     while True:
         try:
-            if not led.status and status.meter.get('actual_total_injection', 0) > injected_power:
+            injected = status.meter.get('actual_total_injection', 0)
+            if not led.status and injected > injected_power:
                 LOG.debug("Switching status led on, injected power > %skW.", injected_power)
                 led.on()
-            elif led.status and status.meter.get('actual_total_injection', 0) <= injected_power:
+            elif led.status and injected <= injected_power:
                 LOG.debug("Switching status led off, injected power <= %skW.", injected_power)
                 led.off()
 
@@ -120,8 +135,7 @@ def read_current_sensors(cs: CurrentSensors) -> None:
     """
     try:
         status = Status()
-        car_value = cs.load_current()
-        vpp_value = cs.vpp_current()
+        vpp_value, car_value = cs.sample()
         status.sensors["current_car"] = car_value
         status.sensors["current_vvp"] = vpp_value
 
@@ -129,8 +143,30 @@ def read_current_sensors(cs: CurrentSensors) -> None:
         LOG.exception("Error reading the current sensor values.")
 
 
+async def current_sensors() -> None:
+    """
+    Read the current sensors.
+    """
+    sensors = CurrentSensors()
+
+    while True:
+        read_current_sensors(sensors)
+        await asyncio.sleep(0.1)
+
+
+def forward_messages(
+    msg_q: mp.Queue, aio_q: asyncio.Queue, loop: asyncio.AbstractEventLoop
+) -> None:
+    """
+    Move the messages from the serial reader process to the event loop.
+    Runs in a thread, since getting a message from msg_q blocks.
+    """
+    while True:
+        loop.call_soon_threadsafe(aio_q.put_nowait, msg_q.get())
+
+
 async def dispatcher(
-    msg_q: mp.Queue,
+    msg_q: asyncio.Queue,
     influx: Optional[DbInflux],
     csv_writer: Optional[CSVWriter],
     load_manager: Optional[LoadManager],
@@ -141,31 +177,30 @@ async def dispatcher(
     """
     LOG.info("Starting dispatcher.")
     status = Status()
-    sensors = CurrentSensors()
 
     while True:
-        try:
-            read_current_sensors(sensors)
-
-            if not msg_q.empty():
-                data = msg_q.get()
-                status.meter = data
-
-                if influx:
-                    await influx.write(data)
-
-                if csv_writer:
-                    csv_writer.write(data)
-
-                if load_manager:
-                    load_manager.process(data)
-
-            else:
-                await asyncio.sleep(0.1)
-
-        except Exception:
-            LOG.exception("Unexpected error in the dispatcher!")
-            await asyncio.sleep(0.1)
+        data = await msg_q.get()
+        # Replace the meter data in one assignment, readers never see a mix of telegrams.
+        status.meter = data
+
+        # An error in one of the consumers does not stop the others.
+        if influx:
+            try:
+                await influx.write(data)
+            except Exception:
+                LOG.exception("Error writing the data to InfluxDB!")
+
+        if csv_writer:
+            try:
+                csv_writer.write(data)
+            except Exception:
+                LOG.exception("Error writing the data to the CSV file!")
+
+        if load_manager:
+            try:
+                load_manager.process(data)
+            except Exception:
+                LOG.exception("Error processing the loads!")
 
 
 async def start_telegram(token: str) -> None:
@@ -277,13 +312,28 @@ def run() -> None:
         LOG.info("Telegram is enabled.")
         asyncio.ensure_future(start_telegram(cfg.get("token")))
 
-    asyncio.ensure_future(dispatcher(msg_q, influx, csv_writer, load_manager))
+    aio_q = asyncio.Queue()
+    threading.Thread(
+        target=forward_messages, args=(msg_q, aio_q, eventloop), daemon=True
+    ).start()
+    asyncio.ensure_future(dispatcher(aio_q, influx, csv_writer, load_manager))
+    asyncio.ensure_future(current_sensors())
 
     if not not_on_a_pi():
-        asyncio.ensure_future(display())
+        asyncio.ensure_future(
+            display(config.getboolean("buttons", "sysfs", fallback=False))
+        )
         asyncio.ensure_future(status_led())
 
-    eventloop.run_forever()
+    try:
+        eventloop.run_forever()
+
+    finally:
+        if influx:
+            eventloop.run_until_complete(influx.close())
+
+        if load_manager:
+            load_manager.close()
 
 
 if __name__ == "__main__":
@@ -12,6 +12,10 @@ def generate_status_message() -> str:
     TODO: create test
     """
     status = Status()
+    # The dispatcher replaces the meter data as a whole, read it only once so
+    # all the values come from the same telegram.
+    meter = status.meter
+    sensors = status.sensors
     try:
         output_lines = ["<b>System</b>", f"up since: {status.system['up_since']}"]
 
@@ -25,19 +29,19 @@ def generate_status_message() -> str:
             )
 
         output_lines.append("<b>Meter data</b>")
-        if status.meter["actual_total_consumption"] > 0:
-            output_lines.append(f"Actual consumption: {status.meter['actual_total_consumption']} kW.")
+        if meter["actual_total_consumption"] > 0:
+            output_lines.append(f"Actual consumption: {meter['actual_total_consumption']} kW.")
         else:
-            output_lines.append(f"Actual injection: {status.meter['actual_total_injection']} kW.")
+            output_lines.append(f"Actual injection: {meter['actual_total_injection']} kW.")
 
         output_lines.append(
-            f"Actual current L1/L2/L3: {status.meter['l1_current']}A/{status.meter['l2_current']}A/{status.meter['l3_current']}A."
+            f"Actual current L1/L2/L3: {meter['l1_current']}A/{meter['l2_current']}A/{meter['l3_current']}A."
         )
 
         # Sensor data:
         output_lines.append("<b>Sensor data</b>")
         output_lines.append(
-            f"Current sensors: Car: {status.sensors['current_car']}A, VVP: {status.sensors['current_vvp']}A."
+            f"Current sensors: Car: {sensors['current_car']}A, VVP: {sensors['current_vvp']}A."
         )
 
         return "\n".join(output_lines)
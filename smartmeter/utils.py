@@ -1,12 +1,27 @@
-import re
+import atexit
 import os
+import queue
 import argparse
 import configparser
-from typing import List, Union, Optional
+from typing import Dict, List, Optional, Tuple, Union
 import logging
-from logging.handlers import RotatingFileHandler
-from coloredlogs import ColoredFormatter
-from singleton_decorator import singleton
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+
+# Suffixes of human readable sizes, as a power of 2 (1k = 1024 = 1 << 10).
+SIZE_SHIFTS = {"k": 10, "M": 20, "G": 30}
+
+# The formatters are shared by all the loggers.
+FILE_FORMATTER = logging.Formatter("%(asctime)s %(levelname)s - %(message)s")
+CONSOLE_LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s]- %(message)s"
+CONSOLE_FORMATTER: Optional[logging.Formatter] = None
+
+# Number of log records kept in memory before they are written to the logfile.
+LOG_BUFFER_CAPACITY = 256
+# Maximum age (in seconds) of the oldest buffered log record before the buffer is written.
+LOG_FLUSH_INTERVAL = 60
+
+# Parsed config files: {filename: (modification time, config)}
+CONFIG_CACHE: Dict[str, Tuple[int, configparser.ConfigParser]] = {}
 
 TIME_DURATION_UNITS = (
     ('week', 60*60*24*7),
@@ -30,14 +45,18 @@ def human_time_duration(seconds):
 
 def autoformat(value: Union[str, int, float]) -> Union[str, int, float]:
     """Convert to str, int or float, based on the content."""
-    if type(value) == str and re.match(r"^\d+$", value):
+    if isinstance(value, (int, float)):
+        return value
+    if not isinstance(value, str):
+        return str(value)
+    # isdecimal accepts the same digits as int(), unlike isdigit (ex. '²').
+    if value.isdecimal():
         return int(value)
-    if type(value) == str and re.match(r"\d+\.\d+", value):
+    whole, dot, fraction = value.partition(".")
+    if dot and whole.isdecimal() and fraction.isdecimal():
         return float(value)
-    if type(value) == int or type(value) == float:
-        return value
 
-    return str(value)
+    return value
 
 
 def convert_from_human_readable(value: Union[str, int]) -> int:
@@ -48,18 +67,18 @@ def convert_from_human_readable(value: Union[str, int]) -> int:
     M = mega
     G = giga
     """
-    power = {"k": 1, "M": 2, "G": 3}
+    value_type = type(value)
 
-    if type(value) == int or (type(value) == str and value.isnumeric()):
+    if value_type is int or (value_type is str and value.isnumeric()):
         return int(value)
-    elif type(value) == str and value[-1] in ["k", "M", "G"]:
-        return int(value[:-1]) * (1024 ** power.get(value[-1], 0))
+    elif value_type is str and value[-1:] in SIZE_SHIFTS:
+        return int(value[:-1]) << SIZE_SHIFTS[value[-1]]
     else:
         raise ValueError(f"'{value}' is an unknown value.")
 
 
-def parse_cli(cli_args: List) -> argparse.Namespace:
-    """Process the CLI arguments."""
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the parser for the CLI arguments."""
     parser = argparse.ArgumentParser(
         description="Read and process data from the digital enery meter."
     )
@@ -70,21 +89,93 @@ def parse_cli(cli_args: List) -> argparse.Namespace:
         dest="fake_serial",
         help="Instead of reading the data from the serial port, you can specify a file with pre recorded data.",
     )
-    return parser.parse_args(cli_args)
+    return parser
+
+
+# The parser is built once, parsing does not change it.
+_PARSER = _build_parser()
+
+
+def parse_cli(cli_args: List) -> argparse.Namespace:
+    """Process the CLI arguments."""
+    return _PARSER.parse_args(cli_args)
 
 
 def load_config(configfile: str) -> configparser.ConfigParser:
     """
     Load the configfile and return the parsed content.
+    The parsed content is cached, the file is only parsed again when it changed.
     """
-    if os.path.exists(configfile):
+    try:
+        fh = open(configfile)
+
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File '{configfile}'' not found!") from None
+
+    with fh:
+        mtime = os.fstat(fh.fileno()).st_mtime_ns
+        cached = CONFIG_CACHE.get(configfile)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        # Unlike read(), read_file() does not silently skip a file it can not read.
         config = configparser.ConfigParser()
-        config.read(configfile)
+        config.read_file(fh)
 
-        return config
+    CONFIG_CACHE[configfile] = (mtime, config)
 
-    else:
-        raise FileNotFoundError(f"File '{configfile}'' not found!")
+    return config
+
+
+def console_formatter() -> logging.Formatter:
+    """
+    Return the formatter for logging to stdout, it is created on first use.
+    coloredlogs (and humanfriendly) are only imported when logging to stdout.
+    """
+    global CONSOLE_FORMATTER
+    if CONSOLE_FORMATTER is None:
+        from coloredlogs import ColoredFormatter
+
+        CONSOLE_FORMATTER = ColoredFormatter(CONSOLE_LOG_FORMAT)
+
+    return CONSOLE_FORMATTER
+
+
+class TimedMemoryHandler(MemoryHandler):
+    """
+    MemoryHandler that also writes the buffer when the oldest record is too old,
+    so a logger with few records does not lag behind.
+    """
+
+    def __init__(self, *args, flush_interval: float = LOG_FLUSH_INTERVAL, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.flush_interval = flush_interval
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            super().shouldFlush(record)
+            or record.created - self.buffer[0].created >= self.flush_interval
+        )
+
+
+def stop_log_listener(listener: QueueListener) -> None:
+    """
+    Stop the log listener, and wait until all the queued records are handled.
+    Does nothing if the listener was already stopped.
+    """
+    # Before Python 3.12, stopping a stopped listener raises an AttributeError.
+    if listener._thread is not None:
+        listener.stop()
+
+
+def shutdown_logging(logger: logging.Logger) -> None:
+    """
+    Write all the pending log records and close the handlers.
+    Child processes exit without running the atexit hooks, so they must call this
+    before they end.
+    """
+    stop_log_listener(logger.queue_listener)
+    logging.shutdown()
 
 
 def init_logging(
@@ -99,8 +190,8 @@ def init_logging(
     """
     Setup the logging targets.
     """
-    if filename[-4:] != ".log":
-        filename = filename + ".log"
+    if not filename.endswith(".log"):
+        filename += ".log"
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, loglevel.upper()))
 
@@ -110,44 +201,72 @@ def init_logging(
         maxBytes=convert_from_human_readable(size),
         backupCount=keep,
     )
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s %(levelname)s - %(message)s")
+    file_handler.setFormatter(FILE_FORMATTER)
+    # Write the records to the file in batches, a warning or worse is written immediately.
+    # logging.shutdown() flushes the buffer at exit, child processes call shutdown_logging().
+    buffer_handler = TimedMemoryHandler(
+        capacity=LOG_BUFFER_CAPACITY,
+        flushLevel=logging.WARNING,
+        target=file_handler,
+        flushOnClose=True,
     )
-    logger.addHandler(file_handler)
+    handlers = [buffer_handler]
 
     # Log to stdout.
     if log_to_stdout:
         console_handler = logging.StreamHandler()
-        console_handler.setFormatter(
-            ColoredFormatter("%(asctime)s %(levelname)s [%(name)s]- %(message)s")
-        )
-        logger.addHandler(console_handler)
+        console_handler.setFormatter(console_formatter())
+        handlers.append(console_handler)
+
+    # The logger only puts the records in a queue, a thread writes them to the handlers,
+    # so a slow disk does not block the caller (ex. while reading the serial port).
+    # The listener is stopped at exit, before logging.shutdown() flushes the handlers.
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_log_listener, listener)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.queue_listener = listener
 
     return logger
 
 
 def update_log_config(
     log_cfg: configparser.SectionProxy, cfg_x: configparser.SectionProxy
-) -> configparser.SectionProxy:
+) -> Dict[str, str]:
     """Overwrites the log config with the items from cfg_x"""
-    config = configparser.ConfigParser()
-    cfg_dict = {}
-    for key in log_cfg.keys():
-        if key in cfg_x.keys():
-            cfg_dict.update({key: cfg_x[key]})
-        else:
-            cfg_dict.update({key: log_cfg[key]})
+    return {key: cfg_x[key] if key in cfg_x else log_cfg[key] for key in log_cfg}
 
-    config["merged"] = cfg_dict
-    return config["merged"]
 
+class Singleton(type):
+    """
+    Metaclass for classes with only one instance.
+    Calling the class returns the same instance every time.
+    """
+    _instances: Dict[type, object] = {}
+
+    def __call__(cls, *args, **kwargs):
+        try:
+            return cls._instances[cls]
+
+        except KeyError:
+            instance = cls._instances[cls] = super().__call__(*args, **kwargs)
+            return instance
 
-@singleton
-class Status():
+
+class Status(metaclass=Singleton):
     """
     Shared status data.
+    The attributes are slots, there is no instance __dict__.
     """
-    system = {}
-    loads = {}
-    meter = {}
-    sensors = {}
+    __slots__ = ("system", "loads", "meter", "sensors")
+    system: Dict
+    loads: Dict[str, Dict]
+    meter: Dict
+    sensors: Dict[str, float]
+
+    def __init__(self) -> None:
+        self.system = {}
+        self.loads = {}
+        self.meter = {}
+        self.sensors = {}
@@ -1,8 +1,12 @@
+import asyncio
 import pytest
 import configparser
 from gpiozero import Device
 from gpiozero.pins.mock import MockFactory
-from smartmeter.aux import LoadManager, Load
+from smartmeter import aux
+from smartmeter.aux import Buttons, LoadManager, Load, SysfsButton, SysfsOutput, image_to_pages
+from smartmeter.utils import Status
+from PIL import Image, ImageDraw, ImageFont
 from time import monotonic
 
 Device.pin_factory = MockFactory()
@@ -94,3 +98,215 @@ def test_load(consumed, injected, state_time, begin_state, end_state):
 
     result = load.process(injected, consumed)
     assert result == end_state
+    assert Status().loads["test_load"]["state"] == end_state
+
+
+@pytest.fixture
+def sysfs_gpio(monkeypatch, tmp_path):
+    """
+    Fake sysfs gpio tree, with the gpiochip of the SoC at base 512 like on recent kernels.
+    """
+    (tmp_path / "gpiochip512").mkdir()
+    (tmp_path / "gpiochip512" / "label").write_text("pinctrl-bcm2711\n")
+    (tmp_path / "gpiochip512" / "base").write_text("512\n")
+    monkeypatch.setattr(aux, "SYSFS_GPIO", str(tmp_path))
+    return tmp_path
+
+
+def test_sysfs_output(sysfs_gpio):
+    """
+    Test switching a pin through a (fake) sysfs gpio tree.
+    """
+    (sysfs_gpio / "gpio536").mkdir()
+    (sysfs_gpio / "gpio536" / "value").write_bytes(b"0\n")
+
+    pin = SysfsOutput(pin=24)
+    assert (sysfs_gpio / "gpio536" / "direction").read_text() == "low"
+    assert pin.value == 0
+
+    pin.on()
+    assert pin.value == 1
+
+    pin.off()
+    assert pin.value == 0
+    pin.close()
+
+
+def test_sysfs_export_pin(sysfs_gpio):
+    """
+    Test if the pin is exported with the number of the gpiochip base plus the pin.
+    """
+    (sysfs_gpio / "export").write_text("")
+
+    assert aux._export_pin(24) == str(sysfs_gpio / "gpio536")
+    assert (sysfs_gpio / "export").read_text() == "536"
+
+
+def test_load_sysfs_fallback(monkeypatch, tmp_path):
+    """
+    Test if the load falls back to gpiozero when the gpiochip is not found in sysfs.
+    """
+    monkeypatch.setattr(aux, "SYSFS_GPIO", str(tmp_path))
+    load = Load(name="test_fallback", max_power=2300, switch_on=1725, hold_timer=5)
+
+    assert not isinstance(load._load, SysfsOutput)
+    load.on()
+    assert load.is_on is True
+    load.close()
+
+
+def test_sysfs_button(sysfs_gpio):
+    """
+    Test the callbacks of a button read through a (fake) sysfs gpio tree.
+    """
+    (sysfs_gpio / "gpio529").mkdir()
+    value_file = sysfs_gpio / "gpio529" / "value"
+    value_file.write_bytes(b"1\n")
+    events = []
+
+    button = SysfsButton(pin=17)
+    button.when_pressed = lambda: events.append("pressed")
+    button.when_released = lambda: events.append("released")
+    assert (sysfs_gpio / "gpio529" / "edge").read_text() == "both"
+    assert button.is_pressed is False
+
+    value_file.write_bytes(b"0\n")
+    button.handle_event()
+    assert button.is_pressed is True
+
+    value_file.write_bytes(b"1\n")
+    button.handle_event()
+    assert button.is_pressed is False
+    assert events == ["pressed", "released"]
+    button.close()
+
+
+def test_image_to_pages():
+    """
+    Test the conversion of an image to the SSD1306 frame buffer layout.
+    """
+    image = Image.new("1", (128, 64))
+    draw = ImageDraw.Draw(image)
+    draw.multiline_text((2, 2), "Charging current:\n    1.5A", fill=255)
+    draw.line((0, 63, 127, 0), fill=255)
+
+    expected = bytearray(128 * 64 // 8)
+    for x in range(128):
+        for y in range(64):
+            if image.getpixel((x, y)):
+                expected[(y >> 3) * 128 + x] |= 1 << (y & 0x07)
+
+    assert image_to_pages(image) == bytes(expected)
+
+
+def test_buttons_sysfs_fallback(monkeypatch, tmp_path):
+    """
+    Test if the buttons fall back to gpiozero when the gpiochip is not found in sysfs,
+    and if the callback is called when the info button is pressed.
+    """
+    monkeypatch.setattr(aux, "SYSFS_GPIO", str(tmp_path))
+    events = []
+
+    buttons = Buttons(use_sysfs=True)
+    buttons.info_button.when_pressed = lambda: events.append("pressed")
+    assert not isinstance(buttons.info_button, SysfsButton)
+
+    buttons.info_button.pin.drive_low()
+    assert events == ["pressed"]
+    buttons.info_button.close()
+    buttons.restart_button.close()
+
+
+def test_loadmanager_process_rounding(monkeypatch):
+    """
+    Test if the power in kW is rounded to the watt, not truncated.
+    """
+    lm = LoadManager()
+    load = Load(name="test_rounding", max_power=1001, switch_on=1001, hold_timer=5)
+    lm.load_list.append(load)
+    calls = []
+    monkeypatch.setattr(load, "process", lambda injected, consumed: calls.append((injected, consumed)))
+
+    lm.process({"actual_total_injection": 1.001, "actual_total_consumption": 0.029})
+    assert calls == [(1001, 29)]
+
+
+def test_current_sensors_spi_fallback(monkeypatch):
+    """
+    Test if the current sensors fall back to gpiozero when the SPI device can not be opened.
+    """
+    class FakeSpiDev:
+        def open(self, bus, device):
+            raise FileNotFoundError("/dev/spidev0.0")
+
+    class FakeSpidev:
+        SpiDev = FakeSpiDev
+
+    monkeypatch.setattr(aux, "spidev", FakeSpidev)
+    sensors = aux.CurrentSensors()
+
+    assert sensors._spi is None
+    assert len(sensors.sample()) == 2
+    sensors.current_vvp.close()
+    sensors.current_car.close()
+
+
+class FakeSSD1306:
+    """Fake oled display, keeps track of the frames shown and the power state."""
+
+    def __init__(self):
+        self.buf = bytearray(128 * 64 // 8)
+        self.frames = 0
+        self.powered = False
+
+    def show(self):
+        self.frames += 1
+
+    def poweron(self):
+        self.powered = True
+
+    def poweroff(self):
+        self.powered = False
+
+
+def fake_display() -> aux.Display:
+    """Create a display without the i2c bus."""
+    disp = aux.Display.__new__(aux.Display)
+    disp._display = FakeSSD1306()
+    disp._font = ImageFont.load_default()
+    disp._image = Image.new("1", (disp.oled_witdh, disp.oled_height))
+    disp._draw = ImageDraw.Draw(disp._image)
+    disp._last_text = None
+    return disp
+
+
+def test_display_cycle():
+    """
+    Test if the display shows the values and is turned off at the end.
+    """
+    disp = fake_display()
+
+    async def run_cycle():
+        await asyncio.wait_for(disp.cycle(wait=0.1, nbr=2), timeout=5)
+
+    asyncio.run(run_cycle())
+
+    assert disp._display.frames == 1  # The text did not change.
+    assert disp._display.powered is False
+
+
+def test_display_cycle_cancel():
+    """
+    Test if cancelling the cycle stops it, and turns the display off.
+    """
+    disp = fake_display()
+
+    async def cancel_cycle():
+        future = disp.cycle(wait=0.1, nbr=10)
+        await asyncio.sleep(0.15)
+        future.cancel()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(cancel_cycle())
+
+    assert disp._display.powered is False
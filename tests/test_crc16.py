@@ -0,0 +1,28 @@
+import re
+import pytest
+from crccheck.crc import Crc16Lha
+from smartmeter.crc16 import crc16, crc16_update
+
+
+@pytest.fixture
+def telegram() -> bytes:
+    """Load a single message from the testfile, up to and including the '!'."""
+    with open("tests/testdata/meter_output.txt", "r") as fh:
+        msg = re.sub(b"\n", b"\r\n", fh.read().encode("ascii"))
+
+    return msg[: msg.find(b"!") + 1]
+
+
+@pytest.mark.parametrize("data", [b"", b"123456789", b"\x00\xff" * 10])
+def test_crc16(data):
+    """Compare the CRC with the one calculated by crccheck."""
+    assert crc16(data) == Crc16Lha.calc(data)
+
+
+def test_crc16_telegram(telegram):
+    """Test the CRC of a telegram, calculated at once or line by line."""
+    crc = 0
+    for line in telegram.splitlines(keepends=True):
+        crc = crc16_update(crc, line)
+
+    assert crc16(telegram) == crc == 0x4A8B
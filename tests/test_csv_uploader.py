@@ -0,0 +1,113 @@
+import os
+import sys
+import minio
+import pytest
+from smartmeter import csv_uploader
+from smartmeter.csv_uploader import copy_file_to_bucket, list_files
+
+
+class FakeS3Error(minio.S3Error):
+    """S3Error without an HTTP response."""
+
+    def __init__(self) -> None:
+        Exception.__init__(self, "AccessDenied")
+
+    def __str__(self) -> str:
+        return "AccessDenied"
+
+
+class FakeMinio:
+    """Minio client keeping the uploaded objects in memory."""
+
+    instances = []
+
+    def __init__(self, *args, fail: bool = False, **kwargs) -> None:
+        self.fail = fail
+        self.objects = {}
+        FakeMinio.instances.append(self)
+
+    def put_object(self, bucket_name, object_name, data, length, part_size=0):
+        # The local file must still exist while it is uploaded.
+        assert os.path.exists(data.name)
+        if self.fail:
+            raise FakeS3Error()
+        self.objects[(bucket_name, object_name)] = data.read(length)
+
+
+@pytest.fixture
+def fake_minio(monkeypatch):
+    """Replace the Minio client class."""
+    monkeypatch.setattr(FakeMinio, "instances", [])
+    monkeypatch.setattr(csv_uploader.minio, "Minio", FakeMinio)
+    return FakeMinio
+
+
+def test_list_files(tmp_path) -> None:
+    """
+    Test if only the regular files matching the pattern are listed.
+    Hidden files (the CSV files still being written), directories
+    and symlinks are skipped.
+    """
+    (tmp_path / "smartmeter_1.csv").write_text("data")
+    (tmp_path / "smartmeter_1.txt").write_text("data")
+    (tmp_path / ".wip__smartmeter_2.csv").write_text("data")
+    (tmp_path / "subdir.csv").mkdir()
+    (tmp_path / "subdir.csv" / "smartmeter_3.csv").write_text("data")
+    os.symlink(tmp_path / "smartmeter_1.csv", tmp_path / "link.csv")
+
+    assert list_files(str(tmp_path), "*.csv") == [str(tmp_path / "smartmeter_1.csv")]
+
+
+def test_list_files_hidden(tmp_path) -> None:
+    """Test if hidden files are listed when the pattern starts with a dot."""
+    (tmp_path / "smartmeter_1.csv").write_text("data")
+    (tmp_path / ".wip__smartmeter_2.csv").write_text("data")
+
+    assert list_files(str(tmp_path), ".wip__*") == [
+        str(tmp_path / ".wip__smartmeter_2.csv")
+    ]
+
+
+def test_copy_file_to_bucket(tmp_path, fake_minio) -> None:
+    """Test if the local file is removed after a successful upload."""
+    csv_file = tmp_path / "smartmeter_1.csv"
+    csv_file.write_text("data")
+    mc = fake_minio()
+
+    assert copy_file_to_bucket(str(csv_file), mc, "bucket") is True
+    assert mc.objects == {("bucket", "smartmeter_1.csv"): b"data"}
+    assert not csv_file.exists()
+
+
+def test_copy_file_to_bucket_error(tmp_path, fake_minio) -> None:
+    """Test if the local file is kept when the upload fails."""
+    csv_file = tmp_path / "smartmeter_1.csv"
+    csv_file.write_text("data")
+    mc = fake_minio(fail=True)
+
+    assert copy_file_to_bucket(str(csv_file), mc, "bucket") is False
+    assert mc.objects == {}
+    assert csv_file.exists()
+
+
+def test_main(tmp_path, monkeypatch, fake_minio, capsys) -> None:
+    """Test if all the files are uploaded with one shared client."""
+    filenames = ["smartmeter_%s.csv" % count for count in range(20)]
+    for filename in filenames:
+        (tmp_path / filename).write_text(filename)
+    monkeypatch.setenv("SMARTMETER_ACCESS_KEY", "access")
+    monkeypatch.setenv("SMARTMETER_SECRET_KEY", "secret")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["csv_uploader", "-d", str(tmp_path), "-p", "*.csv", "-b", "bucket", "-H", "s3"],
+    )
+
+    csv_uploader.main()
+
+    assert len(fake_minio.instances) == 1
+    assert fake_minio.instances[0].objects == {
+        ("bucket", filename): filename.encode() for filename in filenames
+    }
+    assert list(tmp_path.iterdir()) == []
+    assert "Done. Copied 20 files." in capsys.readouterr().out
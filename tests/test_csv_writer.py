@@ -0,0 +1,124 @@
+import csv
+import io
+import logging
+import pytest
+from datetime import datetime
+from smartmeter import csv_writer
+from smartmeter.csv_writer import CSVWriter, FIELDNAMES, format_row
+from smartmeter.digimeter import parse
+
+
+@pytest.fixture
+def telegram() -> dict:
+    """Parse a single message from the testfile."""
+    with open("tests/testdata/meter_output.txt", "r") as fh:
+        return parse(fh.read())
+
+
+def test_write(tmp_path, telegram):
+    """
+    Test writing a batch of telegrams to a CSV file.
+    The file is renamed when max_lines is reached.
+    """
+    writer = CSVWriter(path=str(tmp_path), write_every=2, max_lines=2)
+    writer.write(telegram)
+    assert list(tmp_path.iterdir()) == []
+    # The telegram is shared with the other consumers, it must not change.
+    assert telegram["timestamp"] == "211024195235S"
+    assert "local_timestamp" in telegram
+
+    writer.write(dict(telegram))
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    assert files[0].name.startswith("smartmeter_")
+
+    with open(files[0]) as fh:
+        rows = list(csv.reader(fh))
+
+    assert rows[0] == FIELDNAMES
+    assert len(rows) == 3
+    assert rows[1][0] == "2021-10-24T19:52:35+02:00"
+    assert rows[1][FIELDNAMES.index("total_consumption_day")] == "4248.198"
+
+
+def test_write_order(tmp_path, telegram):
+    """
+    Test if the rows are written in the order they were received,
+    and the rows that exceed max_lines are kept for the next file.
+    """
+    writer = CSVWriter(path=str(tmp_path), write_every=3, max_lines=2)
+    for second in ("35", "36", "37"):
+        writer.write(dict(telegram, timestamp=f"2110241952{second}S"))
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    with open(files[0]) as fh:
+        rows = list(csv.reader(fh))
+
+    assert [row[0] for row in rows[1:]] == [
+        "2021-10-24T19:52:35+02:00",
+        "2021-10-24T19:52:36+02:00",
+    ]
+    assert len(writer.batch) == 1
+    assert writer.batch[0][0] == "2021-10-24T19:52:37+02:00"
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        ("2021-10-24T19:52:35+02:00", 4248.198, 2, 0.0, ""),
+        ("a,b", 'say "hi"', "multi\nline", 1),
+    ],
+)
+def test_format_row(row):
+    """Test if a formatted row is the same as the one written by the csv module."""
+    expected = io.StringIO()
+    csv.writer(expected).writerow(row)
+
+    assert format_row(row) == expected.getvalue().encode()
+
+
+def test_write_rotate_within_second(monkeypatch, tmp_path, telegram, caplog):
+    """
+    Test if a counter is added to the filename when files are rotated within the same second.
+    The file that already exists is logged at debug level.
+    """
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2021, 10, 24, 19, 52, 35)
+
+    monkeypatch.setattr(csv_writer, "datetime", FrozenDatetime)
+    writer = CSVWriter(path=str(tmp_path), write_every=1, max_lines=1)
+    with caplog.at_level(logging.DEBUG, logger="main"):
+        writer.write(dict(telegram))
+        writer.write(dict(telegram))
+
+    names = sorted(f.name for f in tmp_path.iterdir())
+    assert len(names) == 2
+    assert names == ["smartmeter_20211024195235.csv", "smartmeter_20211024195235_1.csv"]
+    clashes = [r for r in caplog.records if "already exists" in r.getMessage()]
+    assert [r.levelno for r in clashes] == [logging.DEBUG]
+    assert str(tmp_path / "smartmeter_20211024195235.csv") in clashes[0].getMessage()
+
+
+def test_close_flush(tmp_path, telegram):
+    """
+    Test if closing with flush writes all the remaining rows, even if they need more than one file.
+    """
+    writer = CSVWriter(path=str(tmp_path), write_every=3, max_lines=2)
+    for second in range(7):
+        writer.write(dict(telegram, timestamp=f"21102419520{second}S"))
+
+    writer.close(flush=True)
+
+    assert writer.batch == []
+    rows = []
+    for filename in sorted(tmp_path.iterdir()):
+        assert not filename.name.startswith(csv_writer.WIP_PREFIX)
+        with open(filename) as fh:
+            rows += list(csv.reader(fh))[1:]
+
+    assert sorted(row[0] for row in rows) == [
+        f"2021-10-24T19:52:0{second}+02:00" for second in range(7)
+    ]
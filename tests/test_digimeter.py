@@ -5,12 +5,30 @@ import re
 from crccheck.crc import Crc16Lha
 from io import BytesIO
 from queue import Queue
-
-from smartmeter.digimeter import parse, autoformat, check_msg, read_serial, serial
+from datetime import datetime, timedelta
+
+from smartmeter.digimeter import (
+    parse,
+    autoformat,
+    check_msg,
+    check_crc,
+    read_serial,
+    fake_serial,
+    serial,
+    calculate_timestamp_drift,
+)
 
 ROOT_DIR = os.path.abspath(os.path.join(pathlib.Path(__file__).parent.resolve(), ".."))
 
 
+class SerialStream(BytesIO):
+    """BytesIO with the in_waiting property of a serial port, data arrives in small chunks."""
+
+    @property
+    def in_waiting(self) -> int:
+        return min(len(self.getbuffer()) - self.tell(), 64)
+
+
 @pytest.fixture
 def msg_stream() -> BytesIO:
     """
@@ -45,7 +63,7 @@ def msg_stream() -> BytesIO:
                 data += telegram
                 detected_telegram_start = False
 
-    return BytesIO(data)
+    return SerialStream(data)
 
 
 @pytest.fixture
@@ -107,7 +125,25 @@ def test_read_serial(monkeypatch, msg_stream):
     q = Queue()
     read_serial(q, "com1", 2400, 8, "N", 1, _quit_after=2)
 
-    assert q.empty() is False
+    assert q.qsize() == 2
+    assert q.get()["timestamp"] == "211024195235S"
+
+
+def test_read_serial_partial_telegram(monkeypatch, msg_stream):
+    """
+    Reading may start in the middle of a telegram, that telegram is skipped.
+    """
+    partial_stream = SerialStream(msg_stream.getvalue()[10:])
+
+    def mock_stream(*args, **kwargs):
+        return partial_stream
+
+    monkeypatch.setattr(serial, "Serial", mock_stream)
+    q = Queue()
+    read_serial(q, "com1", 2400, 8, "N", 1, _quit_after=1)
+
+    assert q.qsize() == 1
+    assert q.get()["timestamp"] != "211024195235S"
 
 
 def test_check_msg(one_msg):
@@ -121,9 +157,28 @@ def test_check_msg(one_msg):
     assert check_msg(msg) is True
 
 
-# def test_fake_serial():
-#     """Test reading serial data froma file."""
-#     q = Queue()
-#     fake_serial(q, "tests/testdata/meter_stream.txt", wait=False)
+@pytest.mark.parametrize(
+    "raw_crc,expected",
+    [(b"0A1F\r\n", True), (b"0a1f", True), (b"0A1E\r\n", False), (b"XXXX\r\n", False)],
+)
+def test_check_crc(raw_crc, expected):
+    """Test the comparison of the calculated CRC with the provided one."""
+    assert check_crc(0x0A1F, raw_crc) is expected
+
+
+def test_fake_serial():
+    """Test reading serial data from a file."""
+    q = Queue()
+    fake_serial(q, "tests/testdata/meter_stream.txt", wait=False, run_forever=False)
+
+    assert q.qsize() == 18
+    assert q.get()["timestamp"] == "211024195235S"
+    assert q.get()["timestamp"] == "211024195236S"
+
+
+def test_calculate_timestamp_drift():
+    """Test the drift between the local time and the telegram timestamp."""
+    telegram_time = datetime.now().astimezone() - timedelta(seconds=90)
+    drift = calculate_timestamp_drift("Electricity", telegram_time.isoformat(timespec="seconds"))
 
-#     assert q.empty() is False
+    assert 89 <= drift <= 91
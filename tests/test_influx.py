@@ -1,8 +1,10 @@
 from typing import Dict
+import asyncio
 import pytest
 import os
 import json
-from smartmeter.influx import convert_timestamp
+from smartmeter import influx
+from smartmeter.influx import DbInflux, convert_timestamp
 
 
 def load_json_datapoints() -> json:
@@ -51,3 +53,79 @@ def test_convert_timestamp() -> None:
     """Test the conversion of a timestamp to iso8601."""
     result = convert_timestamp("211024195235S")
     assert result == "2021-10-24 19:52:35 CEST"
+
+
+def test_write(monkeypatch, valid_input_data) -> None:
+    """
+    Test if every telegram is uploaded, using the same client.
+    """
+    clients = []
+    written = []
+
+    class FakeWriteApi:
+        async def write(self, bucket, record, org, write_precision):
+            written.append(list(record))
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            clients.append(self)
+            self.closed = False
+
+        def write_api(self):
+            return FakeWriteApi()
+
+        async def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(influx, "InfluxDBClientAsync", FakeClient)
+    db = DbInflux(url="http://localhost:8086", token="token", org="org", bucket="bucket")
+
+    async def write_and_close():
+        await db.write(dict(valid_input_data))
+        await db.write(dict(valid_input_data))
+        await db.close()
+
+    asyncio.run(write_and_close())
+
+    assert len(clients) == 1
+    assert clients[0].closed is True
+    assert len(written) == 2
+    assert db.batch == []
+
+
+def test_craft_lineproto(valid_input_data) -> None:
+    """
+    Test the line protocol generated for a telegram.
+    """
+    db = DbInflux(url="http://localhost:8086", token="token", org="org", bucket="bucket")
+    lines = db.craft_lineproto(valid_input_data).split(b"\n")
+
+    assert len(lines) == 3
+    assert lines[0].startswith(b"electricity total_consumption_day=4248.198,")
+    assert b",actual_tariff=2i," in lines[0]
+    assert lines[0].endswith(b",l3_current=1.65 1635097955")
+    assert lines[1] == b"gas total_gas_consumption=3775.342 1635097805"
+    assert lines[2] == b"load load_on=0i 1635097955"
+
+
+def test_craft_lineproto_no_gas(valid_input_data) -> None:
+    """
+    Test if a measurement without fields is left out.
+    """
+    del valid_input_data["total_gas_consumption"]
+    del valid_input_data["gas_timestamp"]
+    db = DbInflux(url="http://localhost:8086", token="token", org="org", bucket="bucket")
+    lines = db.craft_lineproto(valid_input_data).split(b"\n")
+
+    assert [line.split(b" ")[0] for line in lines] == [b"electricity", b"load"]
+
+
+def test_craft_lineproto_unexpected_type(valid_input_data) -> None:
+    """
+    Test if a value that does not have the type of its field is still formatted.
+    """
+    valid_input_data["l1_voltage"] = "227.1V"
+    db = DbInflux(url="http://localhost:8086", token="token", org="org", bucket="bucket")
+    lines = db.craft_lineproto(valid_input_data).split(b"\n")
+
+    assert b',l1_voltage="227.1V",' in lines[0]
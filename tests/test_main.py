@@ -0,0 +1,45 @@
+import asyncio
+from smartmeter.main import dispatcher
+from smartmeter.utils import Status
+
+
+def test_dispatcher(monkeypatch) -> None:
+    """
+    Test if an error in one consumer does not stop the other consumers.
+    """
+    monkeypatch.setattr(Status(), "meter", {})
+    processed = []
+
+    class FailingInflux:
+        async def write(self, data):
+            raise ConnectionError("InfluxDB is down")
+
+    class FakeCSVWriter:
+        def write(self, data):
+            processed.append(("csv", data["timestamp"]))
+
+    class FakeLoadManager:
+        def process(self, data):
+            processed.append(("loads", data["timestamp"]))
+
+    async def dispatch():
+        q = asyncio.Queue()
+        task = asyncio.ensure_future(
+            dispatcher(q, FailingInflux(), FakeCSVWriter(), FakeLoadManager())
+        )
+        for timestamp in ("211024195235S", "211024195236S"):
+            q.put_nowait({"timestamp": timestamp})
+
+        while len(processed) < 4:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(dispatch(), timeout=5))
+
+    assert processed == [
+        ("csv", "211024195235S"),
+        ("loads", "211024195235S"),
+        ("csv", "211024195236S"),
+        ("loads", "211024195236S"),
+    ]
+    assert Status().meter == {"timestamp": "211024195236S"}
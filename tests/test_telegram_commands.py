@@ -0,0 +1,30 @@
+from smartmeter.telegram_commands import generate_status_message
+from smartmeter.utils import Status
+
+
+def test_generate_status_message(monkeypatch) -> None:
+    """
+    Test the status message, with the meter data of one telegram.
+    """
+    status = Status()
+    monkeypatch.setattr(status, "system", {"up_since": "2021-10-24T19:52:35"})
+    monkeypatch.setattr(status, "loads", {"aux": {"state": True, "current_state_time": 65}})
+    monkeypatch.setattr(status, "sensors", {"current_car": 1.5, "current_vvp": 2.5})
+    monkeypatch.setattr(
+        status,
+        "meter",
+        {
+            "actual_total_consumption": 0.0,
+            "actual_total_injection": 1.2,
+            "l1_current": 1.53,
+            "l2_current": 1.94,
+            "l3_current": 1.65,
+        },
+    )
+
+    lines = generate_status_message().split("\n")
+
+    assert "aux: ON for 1 min, 5 secs" in lines
+    assert "Actual injection: 1.2 kW." in lines
+    assert "Actual current L1/L2/L3: 1.53A/1.94A/1.65A." in lines
+    assert "Current sensors: Car: 1.5A, VVP: 2.5A." in lines
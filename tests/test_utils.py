@@ -1,5 +1,20 @@
 import pytest
-from smartmeter.utils import parse_cli, convert_from_human_readable, autoformat
+import os
+import configparser
+import logging
+import multiprocessing as mp
+from smartmeter.utils import (
+    parse_cli,
+    convert_from_human_readable,
+    autoformat,
+    init_logging,
+    LOG_FLUSH_INTERVAL,
+    load_config,
+    shutdown_logging,
+    stop_log_listener,
+    update_log_config,
+    Status,
+)
 
 
 @pytest.mark.parametrize(
@@ -55,8 +70,141 @@ def test_convert_from_human_readable_fail() -> None:
         ("aaa", "aaa"),
         ("1010", 1010),
         ("10.12", 10.12),
+        ("10.12V", "10.12V"),
+        ("10.", "10."),
+        ("1.2.3", "1.2.3"),
+        ("²", "²"),
     ],
 )
 def test_autoformat(in_value, out_value) -> None:
     """Test the autoformat function."""
     assert autoformat(in_value) == out_value
+
+
+def test_load_config(tmp_path) -> None:
+    """
+    Test if the config is only parsed again when the file changed.
+    """
+    configfile = tmp_path / "config.ini"
+    configfile.write_text("[logging]\nloglevel = info\n")
+
+    config = load_config(str(configfile))
+    assert config["logging"]["loglevel"] == "info"
+    assert load_config(str(configfile)) is config
+
+    configfile.write_text("[logging]\nloglevel = debug\n")
+    os.utime(configfile, ns=(0, 0))
+    assert load_config(str(configfile))["logging"]["loglevel"] == "debug"
+
+
+def test_load_config_not_found(tmp_path) -> None:
+    """Test loading a config file that does not exist."""
+    with pytest.raises(FileNotFoundError):
+        load_config(str(tmp_path / "missing.ini"))
+
+
+def test_update_log_config() -> None:
+    """Test if the logging options of a section overwrite the common ones."""
+    config = configparser.ConfigParser()
+    config["logging"] = {"loglevel": "info", "keep": "10", "log_to_stdout": "no"}
+    config["digimeter"] = {"loglevel": "debug", "port": "/dev/serial0"}
+
+    assert update_log_config(config["logging"], config["digimeter"]) == {
+        "loglevel": "debug",
+        "keep": "10",
+        "log_to_stdout": "no",
+    }
+
+
+def test_init_logging(tmp_path) -> None:
+    """
+    Test if the log records are handled by the listener thread, buffered,
+    and written to the file on a warning.
+    """
+    logger = init_logging(
+        filename="test_buffered", logpath=str(tmp_path), name="test_buffered"
+    )
+    logfile = tmp_path / "test_buffered.log"
+
+    logger.info("Buffered message.")
+    assert logfile.read_text() == ""
+
+    logger.warning("Warning message.")
+    stop_log_listener(logger.queue_listener)
+    lines = logfile.read_text().splitlines()
+    assert lines[0].endswith("INFO - Buffered message.")
+    assert lines[1].endswith("WARNING - Warning message.")
+
+    for handler in logger.handlers[:]:
+        handler.close()
+        logger.removeHandler(handler)
+
+
+def test_init_logging_timed_flush(tmp_path) -> None:
+    """Test if the buffer is written when the oldest record is too old."""
+    logger = init_logging(filename="test_timed", logpath=str(tmp_path), name="test_timed")
+    logfile = tmp_path / "test_timed.log"
+
+    logger.info("First message.")
+    record = logger.makeRecord(
+        "test_timed", logging.INFO, __file__, 0, "Late message.", None, None
+    )
+    record.created += LOG_FLUSH_INTERVAL
+    logger.handle(record)
+    # Stopping the listener does not flush the buffer.
+    stop_log_listener(logger.queue_listener)
+    lines = logfile.read_text().splitlines()
+    assert lines[0].endswith("INFO - First message.")
+    assert lines[1].endswith("INFO - Late message.")
+
+    for handler in logger.handlers[:]:
+        handler.close()
+        logger.removeHandler(handler)
+
+
+def log_in_child_process(logpath: str) -> None:
+    """Log some records in a child process, like the serial reader does."""
+    logger = init_logging(filename="test_child", logpath=logpath, name="test_child")
+    try:
+        for count in range(6):
+            logger.info("Message %s.", count)
+    finally:
+        shutdown_logging(logger)
+
+
+def test_init_logging_child_process(tmp_path) -> None:
+    """
+    Test if the records logged in a child process are written to the file,
+    although the child exits without running the atexit hooks.
+    """
+    process = mp.Process(target=log_in_child_process, args=(str(tmp_path),))
+    process.start()
+    process.join(timeout=10)
+
+    assert process.exitcode == 0
+    lines = (tmp_path / "test_child.log").read_text().splitlines()
+    assert len(lines) == 6
+    assert lines[-1].endswith("INFO - Message 5.")
+
+
+def test_status_singleton() -> None:
+    """Test if there is only one Status instance, without an instance __dict__."""
+    assert Status() is Status()
+    assert not hasattr(Status(), "__dict__")
+
+
+def test_init_logging_stdout(tmp_path, capsys) -> None:
+    """Test logging to stdout, with the colored formatter."""
+    logger = init_logging(
+        filename="test_stdout.log",
+        logpath=str(tmp_path),
+        log_to_stdout=True,
+        name="test_stdout",
+    )
+    logger.warning("Warning message.")
+    stop_log_listener(logger.queue_listener)
+
+    assert "Warning message." in capsys.readouterr().err
+    for handler in logger.handlers[:]:
+        handler.close()
+        logger.removeHandler(handler)